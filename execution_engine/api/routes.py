@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer_group
 from typing import Optional
 
-from execution_engine.api.schemas import StandardResponse
+from execution_engine.api.schemas import StandardResponse, ExecutionDetail
 from execution_engine.services.executor import execute_report
-from shared.database import get_db
-from shared.models import ReportExecution
+from shared.database import get_async_db
+from shared.models import ReportExecution, HEAVY, strict_loading_options
 
 router = APIRouter(prefix="/api", tags=["execution"])
 
@@ -48,7 +51,7 @@ async def execute_report_endpoint(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/execution/{execution_id}")
-async def get_execution_status(execution_id: str, db: Session = Depends(get_db)):
+async def get_execution_status(execution_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get execution status and details
 
@@ -59,30 +62,23 @@ async def get_execution_status(execution_id: str, db: Session = Depends(get_db))
         StandardResponse with execution record
     """
     try:
-        execution = db.query(ReportExecution).filter_by(id=execution_id).first()
+        result = await db.execute(
+            select(ReportExecution)
+            # Detail view returns every column; no lazy loads under async
+            .options(undefer_group(HEAVY), *strict_loading_options())
+            .where(ReportExecution.id == execution_id)
+        )
+        execution = result.scalar_one_or_none()
 
         if not execution:
             raise HTTPException(status_code=404, detail="Execution not found")
 
-        return {
+        # Returned directly so orjson encodes datetimes itself (no jsonable_encoder pass)
+        return ORJSONResponse({
             "status": "success",
             "message": "Execution found",
-            "data": {
-                "id": execution.id,
-                "config_id": execution.config_id,
-                "schedule_id": execution.schedule_id,
-                "status": execution.status,
-                "started_at": execution.started_at.isoformat() if execution.started_at else None,
-                "completed_at": execution.completed_at.isoformat() if execution.completed_at else None,
-                "executed_by": execution.executed_by,
-                "execution_context": execution.execution_context,
-                "query_execution_time_ms": execution.query_execution_time_ms,
-                "rows_returned": execution.rows_returned,
-                "file_generated_path": execution.file_generated_path,
-                "file_size_bytes": execution.file_size_bytes,
-                "error_message": execution.error_message
-            }
-        }
+            "data": ExecutionDetail.model_validate(execution).model_dump()
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -1,13 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Dict, Any
 from datetime import datetime
 
 class ExecuteRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, extra='ignore')
+
     schedule_id: Optional[int] = None
     executed_by: str = "manual"
     filter_values: Optional[Dict[str, Any]] = None  # Dynamic filter values
 
 class ExecutionResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     execution_id: str
     config_id: int
     config_name: str
@@ -21,8 +25,28 @@ class ExecutionResponse(BaseModel):
     total_execution_time_ms: int
     time_range: Dict[str, Any]
 
+class ExecutionDetail(BaseModel):
+    """Execution record as returned by GET /execution/{id} (read from ORM object)"""
+    model_config = ConfigDict(from_attributes=True, frozen=True, extra='ignore')
+
+    id: str
+    config_id: int
+    schedule_id: Optional[int] = None
+    status: str
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    executed_by: Optional[str] = None
+    execution_context: Optional[Dict[str, Any]] = None
+    query_execution_time_ms: Optional[int] = None
+    rows_returned: Optional[int] = None
+    file_generated_path: Optional[str] = None
+    file_size_bytes: Optional[int] = None
+    error_message: Optional[str] = None
+
 class StandardResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     status: str
     message: str
-    data: Optional[Any] = None
+    data: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
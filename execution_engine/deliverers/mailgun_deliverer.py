@@ -1,27 +1,100 @@
-import requests
-import time
+import asyncio
+import httpx
 import os
+import uuid
 from datetime import datetime
-from typing import Dict, List
-from sqlalchemy.orm import Session
-from shared.models import ReportDelivery, ReportDeliveryRecipient, ReportDeliveryLog, ReportConfig
-from shared.utils import now_jakarta
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+from shared.models import ReportDelivery, ReportDeliveryLog, ReportConfig
+from shared.utils import now_jakarta, retry_backoff_seconds
+from shared.settings import get_settings
 from execution_engine.services.time_range_calculator import replace_template_variables
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Mailgun configuration from .env
-MAILGUN_API_KEY = os.getenv('MAILGUN_API_KEY')
-MAILGUN_DOMAIN = os.getenv('MAILGUN_DOMAIN')
-MAIL_FROM = os.getenv('MAIL_FROM', 'Finpay')
-MAIL_FROM_ADDRESS = os.getenv('MAIL_FROM_ADDRESS', 'no-reply@finpay.id')
+_settings = get_settings()
+MAILGUN_API_KEY = _settings.mailgun_api_key
+MAILGUN_DOMAIN = _settings.mailgun_domain
+MAIL_FROM = _settings.mail_from
+MAIL_FROM_ADDRESS = _settings.mail_from_address
+
+# Longest single wait between email retries
+EMAIL_RETRY_MAX_WAIT_SECONDS = 300
+
+# Bytes read from the attachment per worker-thread call while uploading
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+# Shared async client (HTTP/2 keep-alive), bound to the event loop it was created on
+_mailgun_client: Optional[httpx.AsyncClient] = None
+_mailgun_client_loop: Optional[asyncio.AbstractEventLoop] = None
 
-def send_email_via_mailgun(
+def _get_mailgun_client() -> httpx.AsyncClient:
+    """
+    Get shared Mailgun HTTP client for the running event loop
+
+    Pooled connections belong to the loop that opened them, so a fresh
+    client is created whenever the running loop changes (the worker keeps
+    one long-lived loop, so it normally reuses a single client). Failed connection attempts
+    are retried by the transport; 429/5xx are left to the delivery retry loop.
+    """
+    global _mailgun_client, _mailgun_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _mailgun_client is None or _mailgun_client_loop is not loop:
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+        _mailgun_client = httpx.AsyncClient(transport=transport, timeout=60)
+        _mailgun_client_loop = loop
+
+    return _mailgun_client
+
+def _open_attachment(file_path: str) -> Tuple[BinaryIO, int]:
+    """Open report file for upload and get its size from the open descriptor"""
+    attachment = open(file_path, 'rb')
+    return attachment, os.fstat(attachment.fileno()).st_size
+
+def _form_field_name(value: str) -> str:
+    """Quote a multipart header parameter the way httpx does"""
+    return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+def _multipart_envelope(data: Dict, file_name: str, boundary: str) -> Tuple[bytes, bytes]:
+    """
+    Build the multipart/form-data bytes around the attachment
+
+    Returns:
+        tuple: (form fields + attachment part header, closing boundary)
+    """
+    parts = []
+    for name, value in data.items():
+        # List values (recipients) become repeated fields
+        for item in (value if isinstance(value, list) else [value]):
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{_form_field_name(name)}"\r\n\r\n'
+                f'{item}\r\n'
+            )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="attachment"; '
+        f'filename="{_form_field_name(file_name)}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+    )
+    return ''.join(parts).encode('utf-8'), f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+async def _stream_multipart(head: bytes, attachment: BinaryIO, tail: bytes) -> AsyncIterator[bytes]:
+    """Yield the request body, reading the attachment in chunks on a worker thread"""
+    yield head
+    while True:
+        chunk = await asyncio.to_thread(attachment.read, ATTACHMENT_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+    yield tail
+
+async def send_email_via_mailgun(
     to_emails: List[str],
     subject: str,
     body: str,
-    file_path: str,
+    attachment: BinaryIO,
+    attachment_size: int,
     file_name: str,
     body_html: str = None
 ) -> Dict:
@@ -32,7 +105,8 @@ def send_email_via_mailgun(
         to_emails: List of recipient email addresses
         subject: Email subject
         body: Email body (plain text)
-        file_path: Path to file to attach
+        attachment: Open binary file to attach
+        attachment_size: Size of the attachment in bytes
         file_name: Name of attachment file
         body_html: Optional HTML body for rich email
 
@@ -42,74 +116,62 @@ def send_email_via_mailgun(
 
     url = f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages"
 
-    with open(file_path, 'rb') as f:
-        files = [("attachment", (file_name, f.read()))]
-
-        data = {
-            "from": f"{MAIL_FROM} <{MAIL_FROM_ADDRESS}>",
-            "to": to_emails,
-            "subject": subject,
-            "text": body
+    data = {
+        "from": f"{MAIL_FROM} <{MAIL_FROM_ADDRESS}>",
+        "to": to_emails,
+        "subject": subject,
+        "text": body
+    }
+
+    # Add HTML body if provided
+    if body_html:
+        data["html"] = body_html
+
+    # The multipart body is streamed: the report is read in chunks on worker
+    # threads while uploading, so it's never fully in memory and the event
+    # loop never blocks on file reads
+    boundary = uuid.uuid4().hex
+    head, tail = _multipart_envelope(data, file_name, boundary)
+
+    response = await _get_mailgun_client().post(
+        url,
+        auth=("api", MAILGUN_API_KEY),
+        content=_stream_multipart(head, attachment, tail),
+        headers={
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(len(head) + attachment_size + len(tail))
         }
+    )
 
-        # Add HTML body if provided
-        if body_html:
-            data["html"] = body_html
-
-        response = requests.post(
-            url,
-            auth=("api", MAILGUN_API_KEY),
-            data=data,
-            files=files,
-            timeout=60
-        )
-
-        response.raise_for_status()
-        return response.json()
+    response.raise_for_status()
+    return response.json()
 
-def deliver_via_email(
-    db: Session,
+async def deliver_via_email(
     delivery: ReportDelivery,
+    delivery_log: ReportDeliveryLog,
     file_path: str,
-    execution_id: str,
     config: ReportConfig,
-    time_range: Dict,
-    schedule_id: int = None
+    time_range: Dict
 ) -> int:
     """
     Send report via email with retry logic
 
     Args:
-        db: Database session (shared with executor)
         delivery: ReportDelivery model with configuration
+        delivery_log: Pending ReportDeliveryLog to fill in (flushed by executor)
         file_path: Path to generated report file
-        execution_id: UUID of execution record
         config: ReportConfig model
         time_range: Time range dict with template variables
-        schedule_id: Optional schedule ID
 
     Returns:
         int: delivery_log_id
     """
-    try:
-        # Create delivery log record
-        delivery_log = ReportDeliveryLog(
-            config_id=config.id,
-            delivery_id=delivery.id,
-            schedule_id=schedule_id,
-            execution_id=execution_id,
-            status='pending',
-            sent_at=now_jakarta()
-        )
-        db.add(delivery_log)
-        db.flush()
-        log_id = delivery_log.id
+    log_id = delivery_log.id
+    send_start = delivery_log.sent_at  # Stamped by the executor when the log was created
 
-        # Get recipients
-        recipients = db.query(ReportDeliveryRecipient).filter_by(
-            delivery_id=delivery.id,
-            is_active=True
-        ).all()
+    try:
+        # Get recipients (eager-loaded with the delivery, no extra query)
+        recipients = delivery.active_recipients
 
         if not recipients:
             raise ValueError(f"No active recipients found for delivery {delivery.id}")
@@ -131,32 +193,37 @@ def deliver_via_email(
 
         # Get file name
         file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
 
         # Retry logic
         max_retry = delivery.max_retry or 3
         retry_interval = delivery.retry_interval_minutes or 5
 
         last_error = None
-        send_start = now_jakarta()
 
         for attempt in range(1, max_retry + 1):
             try:
-                # Send via Mailgun
-                mailgun_response = send_email_via_mailgun(
-                    to_emails=email_addresses,
-                    subject=subject,
-                    body=body,
-                    file_path=file_path,
-                    file_name=file_name,
-                    body_html=body_html
-                )
+                # Open off the event loop so a slow report volume doesn't stall other deliveries
+                attachment, file_size = await asyncio.to_thread(_open_attachment, file_path)
+                try:
+                    # Send via Mailgun
+                    mailgun_response = await send_email_via_mailgun(
+                        to_emails=email_addresses,
+                        subject=subject,
+                        body=body,
+                        attachment=attachment,
+                        attachment_size=file_size,
+                        file_name=file_name,
+                        body_html=body_html
+                    )
+                finally:
+                    attachment.close()
 
                 # Success - update log
-                processing_time = (now_jakarta() - send_start).total_seconds() * 1000
+                completed_at = now_jakarta()
+                processing_time = (completed_at - send_start).total_seconds() * 1000
 
                 delivery_log.status = 'success'
-                delivery_log.completed_at = now_jakarta()
+                delivery_log.completed_at = completed_at
                 delivery_log.recipient_count = len(email_addresses)
                 delivery_log.success_count = len(email_addresses)
                 delivery_log.failure_count = 0
@@ -170,16 +237,17 @@ def deliver_via_email(
                     'subject': subject
                 }
 
-                db.flush()  # Don't commit here, let executor commit
                 return log_id
 
             except Exception as e:
                 last_error = str(e)
 
                 if attempt < max_retry:
-                    # Wait before retry (exponential backoff)
-                    wait_seconds = retry_interval * 60 * attempt
-                    time.sleep(wait_seconds)
+                    # Wait before retry (jittered exponential backoff, capped)
+                    wait_seconds = retry_backoff_seconds(
+                        attempt, base=retry_interval * 60, cap=EMAIL_RETRY_MAX_WAIT_SECONDS
+                    )
+                    await asyncio.sleep(wait_seconds)
                     continue
                 else:
                     # Max retries reached - mark as failed
@@ -187,10 +255,11 @@ def deliver_via_email(
 
     except Exception as e:
         # Failed - update log
-        processing_time = (now_jakarta() - send_start).total_seconds() * 1000
+        completed_at = now_jakarta()
+        processing_time = (completed_at - send_start).total_seconds() * 1000
 
         delivery_log.status = 'failed'
-        delivery_log.completed_at = now_jakarta()
+        delivery_log.completed_at = completed_at
         delivery_log.recipient_count = len(email_addresses) if 'recipients' in locals() else 0
         delivery_log.success_count = 0
         delivery_log.failure_count = len(email_addresses) if 'recipients' in locals() else 0
@@ -198,8 +267,6 @@ def deliver_via_email(
         delivery_log.error_message = str(e)
         delivery_log.processing_time_ms = int(processing_time)
 
-        db.flush()  # Don't commit here, let executor commit
-
         # Don't raise - just log the failure
         # This allows execution to complete even if delivery fails
         print(f"Email delivery failed: {e}")
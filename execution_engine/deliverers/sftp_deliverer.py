@@ -1,13 +1,17 @@
-import paramiko
+import asyncio
+import asyncssh
 import os
 import time
+from collections import ChainMap
 from datetime import datetime
 from typing import Dict
-from sqlalchemy.orm import Session
 from shared.models import ReportDelivery, ReportDeliveryLog, ReportConfig
-from shared.utils import now_jakarta
+from shared.utils import now_jakarta, retry_backoff_seconds
 from execution_engine.services.time_range_calculator import replace_template_variables
 
+# Outstanding SFTP write requests per upload (bounds buffered data per transfer)
+SFTP_MAX_REQUESTS = 64
+
 
 def build_remote_filename(
     filename_pattern: str,
@@ -47,16 +51,16 @@ def build_remote_filename(
     _, ext = os.path.splitext(local_file_path)
     ext = ext.lstrip('.')  # Remove leading dot
 
-    # Build template variables
-    template_vars = {
+    # Build template variables; time_range is chained in (not copied) and
+    # listed first so its keys still take precedence, as with the old merge
+    template_vars = ChainMap(time_range, {
         'report_name': config.report_name.replace(' ', '_'),
         'date': now.strftime('%Y-%m-%d'),
         'time': now.strftime('%H%M%S'),
         'datetime': now.strftime('%Y%m%d_%H%M%S'),
         'execution_id': execution_id,
-        'ext': ext,
-        **time_range  # Include date_from, date_to, etc.
-    }
+        'ext': ext
+    })
 
     # Replace variables in pattern
     filename = replace_template_variables(filename_pattern, template_vars)
@@ -68,7 +72,7 @@ def build_remote_filename(
     return filename
 
 
-def upload_file_via_sftp(
+async def upload_file_via_sftp(
     host: str,
     port: int,
     username: str,
@@ -80,7 +84,7 @@ def upload_file_via_sftp(
     timeout: int = 30
 ) -> Dict:
     """
-    Upload file to SFTP server using paramiko
+    Upload file to SFTP server using asyncssh
 
     Args:
         host: SFTP server hostname/IP
@@ -97,138 +101,84 @@ def upload_file_via_sftp(
         dict: Upload result with details
 
     Raises:
-        paramiko.AuthenticationException: Authentication failed
-        paramiko.SSHException: SSH connection failed
+        asyncssh.PermissionDenied: Authentication failed
+        asyncssh.Error: SSH connection/protocol failure
         IOError: File upload/permission error
-        socket.timeout: Connection timeout
+        asyncio.TimeoutError: Connection timeout
     """
     upload_start = time.time()
 
-    # Initialize SSH client
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # Auto-accept host keys
-
-    try:
-        # Connect to SFTP server
-        ssh.connect(
-            hostname=host,
-            port=port,
-            username=username,
-            password=password,
-            timeout=timeout,
-            allow_agent=False,  # Don't use SSH agent
-            look_for_keys=False  # Don't look for SSH keys, use password
-        )
-
-        # Open SFTP session
-        sftp = ssh.open_sftp()
-
-        try:
+    # Password auth only, auto-accept host keys
+    async with asyncssh.connect(
+        host,
+        port=port,
+        username=username,
+        password=password,
+        known_hosts=None,
+        client_keys=None,  # Don't look for SSH keys, use password
+        agent_path=None,  # Don't use SSH agent
+        connect_timeout=timeout
+    ) as conn:
+        async with conn.start_sftp_client() as sftp:
             # Build full remote path
             remote_path = remote_path.rstrip('/')
             full_remote_path = f"{remote_path}/{filename}"
 
-            # Check if remote directory exists
-            try:
-                sftp.stat(remote_path)
-            except FileNotFoundError:
-                if create_directory:
-                    # Create directory recursively
-                    _create_remote_directory(sftp, remote_path)
-                else:
-                    raise IOError(f"Remote directory does not exist: {remote_path}")
+            # Make sure remote directory exists
+            if create_directory:
+                await sftp.makedirs(remote_path or '/', exist_ok=True)
+            elif not await sftp.isdir(remote_path or '/'):
+                raise IOError(f"Remote directory does not exist: {remote_path}")
 
-            # Upload file
-            sftp.put(local_file_path, full_remote_path)
+            # Upload file with many write requests in flight; block size is left
+            # to the server's negotiated max write length
+            await sftp.put(local_file_path, full_remote_path, max_requests=SFTP_MAX_REQUESTS)
 
-            # Verify upload by getting file stats
-            remote_stat = sftp.stat(full_remote_path)
+            # Verify upload by comparing local and remote sizes
+            remote_stat = await sftp.stat(full_remote_path)
             local_size = os.path.getsize(local_file_path)
 
-            if remote_stat.st_size != local_size:
-                raise IOError(f"Upload verification failed: size mismatch (local={local_size}, remote={remote_stat.st_size})")
-
-            upload_time = (time.time() - upload_start) * 1000  # Convert to ms
-
-            return {
-                'success': True,
-                'remote_path': full_remote_path,
-                'file_size': remote_stat.st_size,
-                'upload_time_ms': int(upload_time),
-                'host': host,
-                'port': port
-            }
-
-        finally:
-            sftp.close()
-
-    finally:
-        ssh.close()
-
-
-def _create_remote_directory(sftp, path):
-    """
-    Recursively create remote directory
-
-    Args:
-        sftp: Paramiko SFTP client
-        path: Directory path to create
-    """
-    dirs = []
-    current = path
+            if remote_stat.size != local_size:
+                raise IOError(f"Upload verification failed: size mismatch (local={local_size}, remote={remote_stat.size})")
 
-    # Find which directories need to be created
-    while current and current != '/':
-        try:
-            sftp.stat(current)
-            break  # Directory exists
-        except FileNotFoundError:
-            dirs.append(current)
-            current = os.path.dirname(current)
+    upload_time = (time.time() - upload_start) * 1000  # Convert to ms
 
-    # Create directories from parent to child
-    for dir_path in reversed(dirs):
-        sftp.mkdir(dir_path)
+    return {
+        'success': True,
+        'remote_path': full_remote_path,
+        'file_size': remote_stat.size,
+        'upload_time_ms': int(upload_time),
+        'host': host,
+        'port': port
+    }
 
 
-def deliver_via_sftp(
-    db: Session,
+async def deliver_via_sftp(
     delivery: ReportDelivery,
+    delivery_log: ReportDeliveryLog,
     file_path: str,
     execution_id: str,
     config: ReportConfig,
-    time_range: Dict,
-    schedule_id: int = None
+    time_range: Dict
 ) -> int:
     """
     Deliver report via SFTP with retry logic
 
     Args:
-        db: Database session (shared with executor)
         delivery: ReportDelivery model with SFTP configuration
+        delivery_log: Pending ReportDeliveryLog to fill in (flushed by executor)
         file_path: Path to generated report file
         execution_id: UUID of execution record
         config: ReportConfig model
         time_range: Time range dict with template variables
-        schedule_id: Optional schedule ID
 
     Returns:
         int: delivery_log_id
     """
-    try:
-        # Create delivery log record
-        delivery_log = ReportDeliveryLog(
-            config_id=config.id,
-            delivery_id=delivery.id,
-            schedule_id=schedule_id,
-            execution_id=execution_id,
-            status='pending',
-            sent_at=now_jakarta()
-        )
-        db.add(delivery_log)
-        db.flush()
-        log_id = delivery_log.id
+    log_id = delivery_log.id
+    send_start = delivery_log.sent_at  # Stamped by the executor when the log was created
 
+    try:
         # Parse SFTP config from delivery_config JSON
         sftp_config = delivery.delivery_config or {}
 
@@ -240,12 +190,7 @@ def deliver_via_sftp(
         create_directory = sftp_config.get('create_directory', False)
         timeout = sftp_config.get('timeout', 30)
 
-        # Get filename template from config parameters (not delivery_config)
-        # This is where the filename is configured in the UI
-        config_params = config.parameters or {}
-        filename_pattern = config_params.get('filename_template', '{report_name}.{ext}')
-
-        # Validate required fields
+        # Validate required fields before any other work
         if not host:
             raise ValueError("SFTP host is required in delivery_config")
         if not username:
@@ -253,6 +198,11 @@ def deliver_via_sftp(
         if not password:
             raise ValueError("SFTP password is required in delivery_config")
 
+        # Get filename template from config parameters (not delivery_config)
+        # This is where the filename is configured in the UI
+        config_params = config.parameters or {}
+        filename_pattern = config_params.get('filename_template', '{report_name}.{ext}')
+
         # Build remote filename
         remote_filename = build_remote_filename(
             filename_pattern=filename_pattern,
@@ -262,9 +212,6 @@ def deliver_via_sftp(
             local_file_path=file_path
         )
 
-        # Get file size
-        file_size = os.path.getsize(file_path)
-
         # Retry logic - shorter intervals for SFTP (seconds not minutes)
         max_retry = delivery.max_retry or 3
         retry_interval = delivery.retry_interval_minutes or 2  # Now treated as seconds
@@ -272,7 +219,6 @@ def deliver_via_sftp(
         # Overall timeout to prevent hanging (10 seconds max)
         overall_timeout = 10  # seconds
         last_error = None
-        send_start = now_jakarta()
 
         for attempt in range(1, max_retry + 1):
             # Check overall timeout
@@ -282,7 +228,7 @@ def deliver_via_sftp(
 
             try:
                 # Upload via SFTP with short timeout (10s)
-                upload_result = upload_file_via_sftp(
+                upload_result = await upload_file_via_sftp(
                     host=host,
                     port=port,
                     username=username,
@@ -295,15 +241,16 @@ def deliver_via_sftp(
                 )
 
                 # Success - update log
-                processing_time = (now_jakarta() - send_start).total_seconds() * 1000
+                completed_at = now_jakarta()
+                processing_time = (completed_at - send_start).total_seconds() * 1000
 
                 delivery_log.status = 'success'
-                delivery_log.completed_at = now_jakarta()
+                delivery_log.completed_at = completed_at
                 delivery_log.recipient_count = 1  # SFTP = 1 destination
                 delivery_log.success_count = 1
                 delivery_log.failure_count = 0
                 delivery_log.retry_count = attempt - 1
-                delivery_log.file_size_bytes = file_size
+                delivery_log.file_size_bytes = upload_result['file_size']
                 delivery_log.processing_time_ms = int(processing_time)
                 delivery_log.delivery_details = {
                     'sftp_host': host,
@@ -315,16 +262,17 @@ def deliver_via_sftp(
                     'method': 'sftp'
                 }
 
-                db.flush()  # Don't commit here, let executor commit
                 return log_id
 
             except Exception as e:
                 last_error = str(e)
 
-                if attempt < max_retry:
-                    # Wait before retry (short intervals in seconds)
-                    wait_seconds = retry_interval * attempt
-                    time.sleep(wait_seconds)
+                # Never wait past the overall timeout
+                remaining = overall_timeout - (now_jakarta() - send_start).total_seconds()
+                if attempt < max_retry and remaining > 0:
+                    # Wait before retry (jittered exponential backoff, in seconds)
+                    wait_seconds = retry_backoff_seconds(attempt, base=retry_interval, cap=remaining)
+                    await asyncio.sleep(wait_seconds)
                     continue
                 else:
                     # Max retries reached - mark as failed
@@ -332,14 +280,15 @@ def deliver_via_sftp(
 
     except Exception as e:
         # Failed - update log
-        processing_time = (now_jakarta() - send_start).total_seconds() * 1000
+        completed_at = now_jakarta()
+        processing_time = (completed_at - send_start).total_seconds() * 1000
 
         # Build safe config for logging (mask password)
         safe_sftp_config = {k: ('***MASKED***' if k == 'password' else v)
                            for k, v in sftp_config.items()} if 'sftp_config' in locals() else {}
 
         delivery_log.status = 'failed'
-        delivery_log.completed_at = now_jakarta()
+        delivery_log.completed_at = completed_at
         delivery_log.recipient_count = 1
         delivery_log.success_count = 0
         delivery_log.failure_count = 1
@@ -353,8 +302,6 @@ def deliver_via_sftp(
             'method': 'sftp'
         }
 
-        db.flush()  # Don't commit here, let executor commit
-
         # Don't raise - just log the failure
         # This allows execution to complete even if delivery fails
         print(f"SFTP delivery failed: {e}")
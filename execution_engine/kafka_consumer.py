@@ -1,79 +1,108 @@
-import os
-import json
-import ssl
-from kafka import KafkaConsumer
-from kafka.errors import KafkaError
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import asyncio
+import orjson
+import threading
+from concurrent.futures import wait
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping
+from confluent_kafka import Consumer, KafkaError, KafkaException, TopicPartition
+from shared.settings import get_settings
 
 # Use structured logger
 from shared.logger import setup_logger
 logger = setup_logger('kafka_consumer')
 
+# How often the main thread polls while a batch runs (keeps max.poll.interval.ms happy)
+KEEPALIVE_POLL_SECONDS = 30
+
+
+@lru_cache(maxsize=1)
+def _security_config() -> Mapping[str, Any]:
+    """
+    Build librdkafka security properties for the configured protocol
+
+    Built once per process and shared by every consumer instance (restarts
+    included); the mapping is read-only.
+    """
+    settings = get_settings()
+    security_protocol = settings.kafka_security_protocol
+
+    if security_protocol == 'SASL_SSL':
+        # SASL_SSL configuration for Aiven Kafka
+        config = {
+            'security.protocol': 'SASL_SSL',
+            'sasl.mechanism': 'SCRAM-SHA-256',
+            'sasl.username': settings.kafka_sasl_username,
+            'sasl.password': settings.kafka_sasl_password,
+            # Same as the previous ssl context: no cert or hostname verification
+            'enable.ssl.certificate.verification': False,
+            'ssl.endpoint.identification.algorithm': 'none',
+        }
+        logger.info("🔒 Kafka consumer configured with SASL_SSL security")
+
+    elif security_protocol == 'PLAINTEXT':
+        # PLAINTEXT configuration for local Kafka
+        config = {
+            'security.protocol': 'PLAINTEXT',
+        }
+        logger.info("🔓 Kafka consumer configured with PLAINTEXT security")
+
+    else:
+        raise ValueError(f"Unsupported Kafka security protocol: {security_protocol}")
+
+    return MappingProxyType(config)
+
 
 class ReportKafkaConsumer:
     """Kafka consumer for report execution requests"""
 
     def __init__(self):
-        bootstrap_servers = os.getenv('KAFKA_BOOTSTRAP_SERVERS', '').split(',')
-        topic = os.getenv('KAFKA_TOPIC_EXECUTION_REQUESTS', 'report-scheduler-execution-request')
-        group_id = os.getenv('KAFKA_CONSUMER_GROUP', 'report-workers')
-        security_protocol = os.getenv('KAFKA_SECURITY_PROTOCOL', 'SASL_SSL').upper()
+        settings = get_settings()
+        bootstrap_servers = list(settings.kafka_bootstrap_servers)
+        topic = settings.kafka_topic_execution_requests
+        group_id = settings.kafka_consumer_group
+        security_protocol = settings.kafka_security_protocol
 
         logger.info(f"Initializing Kafka consumer for topic: {topic}")
         logger.info(f"Bootstrap servers: {bootstrap_servers}")
         logger.info(f"Consumer group: {group_id}")
         logger.info(f"Security protocol: {security_protocol}")
 
+        self.consumer = None
+        self.max_poll_records = settings.kafka_max_poll_records  # Max messages per poll batch
+        # Reports from one batch run concurrently, capped to bound DB connection use
+        self.max_concurrency = settings.kafka_batch_concurrency
+
         try:
-            # Common consumer configuration
+            # Common consumer configuration (librdkafka property names)
             consumer_config = {
-                'bootstrap_servers': bootstrap_servers,
-                'group_id': group_id,
-                'value_deserializer': lambda m: json.loads(m.decode('utf-8')),
-                'auto_offset_reset': 'earliest',
-                'enable_auto_commit': False,  # Manual commit for reliability
+                'bootstrap.servers': ','.join(bootstrap_servers),
+                'group.id': group_id,
+                'auto.offset.reset': 'earliest',
+                # At-least-once: offsets are stored only after a message is handled,
+                # and a background timer commits whatever has been stored
+                'enable.auto.commit': True,
+                'enable.auto.offset.store': False,
+                'auto.commit.interval.ms': 5000,
                 # Performance & reliability settings
-                'max_poll_records': 10,  # Process max 10 messages per poll
-                'max_poll_interval_ms': 900000,  # 15 minutes - max time between polls
-                'session_timeout_ms': 120000,  # 2 minutes - heartbeat timeout (increased for long processing)
-                'heartbeat_interval_ms': 30000,  # 30 seconds - send heartbeat every 30s
-                'fetch_min_bytes': 1,  # Don't wait for minimum bytes
-                'fetch_max_wait_ms': 500,  # Max wait 500ms for new messages
+                'max.poll.interval.ms': 900000,  # 15 minutes - max time between polls
+                'session.timeout.ms': 120000,  # 2 minutes - heartbeat timeout (increased for long processing)
+                'heartbeat.interval.ms': 30000,  # 30 seconds - send heartbeat every 30s
+                # Fetch batching: fewer, fuller fetches when the topic has a backlog
+                'fetch.min.bytes': settings.kafka_fetch_min_bytes,  # Default 64KB per fetch
+                'fetch.wait.max.ms': settings.kafka_fetch_max_wait_ms,  # Max wait (default 1s) for min bytes
+                'fetch.max.bytes': settings.kafka_fetch_max_bytes,  # Default 50MB per fetch response
+                'on_commit': self._on_commit,  # Result of background offset commits
             }
 
             # Configure security based on protocol
-            if security_protocol == 'SASL_SSL':
-                # SASL_SSL configuration for Aiven Kafka
-                ssl_context = ssl.create_default_context()
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
-
-                consumer_config.update({
-                    'security_protocol': 'SASL_SSL',
-                    'sasl_mechanism': 'SCRAM-SHA-256',
-                    'sasl_plain_username': os.getenv('KAFKA_SASL_USERNAME'),
-                    'sasl_plain_password': os.getenv('KAFKA_SASL_PASSWORD'),
-                    'ssl_context': ssl_context,
-                })
-                logger.info("🔒 Kafka consumer configured with SASL_SSL security")
-
-            elif security_protocol == 'PLAINTEXT':
-                # PLAINTEXT configuration for local Kafka
-                consumer_config.update({
-                    'security_protocol': 'PLAINTEXT',
-                })
-                logger.info("🔓 Kafka consumer configured with PLAINTEXT security")
-
-            else:
-                raise ValueError(f"Unsupported Kafka security protocol: {security_protocol}")
-
-            self.consumer = KafkaConsumer(topic, **consumer_config)
+            consumer_config.update(_security_config())
+
+            self.consumer = Consumer(consumer_config)
+            self.consumer.subscribe([topic])
             logger.info("✅ Kafka consumer initialized successfully")
 
-        except KafkaError as e:
+        except KafkaException as e:
             logger.error(f"❌ Failed to initialize Kafka consumer: {e}")
             raise
 
@@ -81,6 +110,13 @@ class ReportKafkaConsumer:
         """
         Consume messages from Kafka and process them using the provided handler
 
+        Messages from one poll batch are handled concurrently on a long-lived
+        event loop (its own thread, reused for every batch so DB/HTTP clients
+        stay warm) while the assigned partitions are paused and this thread
+        keeps polling, so long reports don't exceed max.poll.interval.ms. Each handled
+        message's offset is stored locally; librdkafka commits stored
+        offsets every 5s and once more when the consumer closes.
+
         Args:
             message_handler: Async function that processes the message
         """
@@ -88,46 +124,122 @@ class ReportKafkaConsumer:
         logger.info("⏳ Waiting for messages... (Press Ctrl+C to stop)")
 
         message_count = 0
+        batch_loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=batch_loop.run_forever, name='report-batch', daemon=True)
+        loop_thread.start()
 
         try:
-            for message in self.consumer:
-                try:
-                    message_count += 1
-                    data = message.value
-                    execution_id = data.get('execution_id', 'unknown')
-
-                    logger.info(f"📨 [{message_count}] Received message - Execution ID: {execution_id}")
-                    logger.debug(f"Full message: {data}")
-
-                    # Call the message handler
-                    message_handler(data)
-
-                    # Commit offset on success
-                    self.consumer.commit()
-                    logger.info(f"✅ [{message_count}] Successfully processed and committed - Execution ID: {execution_id}")
-
-                except Exception as e:
-                    logger.error(f"❌ [{message_count}] Error processing message: {e}", exc_info=True)
-
-                    # ALWAYS commit offset to skip message and prevent infinite retries
-                    # Failed executions are already logged in report_executions table
-                    # We don't want consumer to crash or retry indefinitely
-                    logger.warning(f"⚠️ Committing offset to skip failed message and continue processing queue")
+            while True:
+                batch = self.consumer.consume(num_messages=self.max_poll_records, timeout=1.0)
+                if not batch:
+                    continue
+
+                messages = []
+                for message in batch:
+                    if message.error():
+                        if message.error().code() != KafkaError._PARTITION_EOF:
+                            logger.error(f"❌ Consumer error: {message.error()}")
+                        continue
+                    messages.append(message)
+
+                if not messages:
+                    continue
+
+                self._run_batch_paused(batch_loop, messages, message_count, message_handler)
+                message_count += len(messages)
+
+                # Processed or failed-and-logged: either way move past them
+                for message in messages:
                     try:
-                        self.consumer.commit()
-                        logger.info(f"✅ [{message_count}] Offset committed despite error")
-                    except Exception as commit_error:
-                        logger.error(f"❌ Failed to commit offset: {commit_error}")
-                        # If commit fails, consumer might be disconnected - will restart
+                        self.consumer.store_offsets(message=message)
+                    except KafkaException as e:
+                        # Partition was revoked by a rebalance during the batch;
+                        # its new owner will get the message again
+                        logger.warning(f"⚠️ Could not store offset for {message.topic()}[{message.partition()}]@{message.offset()}: {e}")
 
         except KeyboardInterrupt:
             logger.info("🛑 Consumer interrupted by user")
         except Exception as e:
             logger.error(f"❌ Consumer error: {e}", exc_info=True)
         finally:
+            # Batches are always awaited in _run_batch_paused, so the loop is idle here
+            batch_loop.call_soon_threadsafe(batch_loop.stop)
+            loop_thread.join()
+            batch_loop.run_until_complete(batch_loop.shutdown_asyncgens())
+            batch_loop.close()
             logger.info(f"📊 Total messages processed: {message_count}")
+            # close() commits the remaining stored offsets
             self.close()
 
+    def _on_commit(self, err, partitions):
+        """Callback for background offset commits; failures are logged (next commit supersedes them)"""
+        if err is not None:
+            logger.error(f"❌ Failed to commit offset: {err}")
+        else:
+            logger.debug(f"Offsets committed: {partitions}")
+
+    def _run_batch_paused(self, batch_loop, messages, message_count: int, message_handler):
+        """Run a batch on the batch event loop, polling with partitions paused until it finishes"""
+        self.consumer.pause(self.consumer.assignment())
+        future = asyncio.run_coroutine_threadsafe(
+            self._handle_batch(messages, message_count, message_handler), batch_loop
+        )
+        try:
+            while True:
+                done, _ = wait([future], timeout=KEEPALIVE_POLL_SECONDS)
+                if done:
+                    break
+
+                # Partitions assigned by a rebalance meanwhile start unpaused
+                self.consumer.pause(self.consumer.assignment())
+                message = self.consumer.poll(0)
+                if message is not None and not message.error():
+                    # Not ours to handle yet: rewind so it's fetched again after resume
+                    self.consumer.seek(TopicPartition(message.topic(), message.partition(), message.offset()))
+
+            future.result()
+        except KeyboardInterrupt:
+            # Let the in-flight batch finish before the consumer closes
+            wait([future])
+            raise
+        finally:
+            self.consumer.resume(self.consumer.assignment())
+
+    async def _handle_batch(self, messages, message_count: int, message_handler):
+        """Handle a poll batch concurrently, at most max_concurrency at a time"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(
+            *[
+                self._handle_message(message, message_count + index, message_handler, semaphore)
+                for index, message in enumerate(messages, start=1)
+            ],
+            return_exceptions=True
+        )
+
+    async def _handle_message(self, message, message_count: int, message_handler, semaphore):
+        """Run handler for one message; errors are logged and the message is skipped"""
+        try:
+            # orjson parses the raw bytes directly (no intermediate str decode)
+            data = orjson.loads(message.value())
+            execution_id = data.get('execution_id', 'unknown')
+
+            logger.info(f"📨 [{message_count}] Received message - Execution ID: {execution_id}")
+            logger.debug(f"Full message: {data}")
+
+            # Call the message handler
+            async with semaphore:
+                await message_handler(data)
+
+            logger.info(f"✅ [{message_count}] Successfully processed - Execution ID: {execution_id}")
+
+        except Exception as e:
+            logger.error(f"❌ [{message_count}] Error processing message: {e}", exc_info=True)
+
+            # ALWAYS commit offset to skip message and prevent infinite retries
+            # Failed executions are already logged in report_executions table
+            # We don't want consumer to crash or retry indefinitely
+            logger.warning(f"⚠️ Skipping failed message, its offset is stored and committed")
+
     def close(self):
         """Close the Kafka consumer"""
         if self.consumer:
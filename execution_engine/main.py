@@ -1,15 +1,14 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from execution_engine.api import routes
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from shared.settings import get_settings
 
 app = FastAPI(
     title="Scheduling Report - Execution Engine",
     version="1.0.0",
-    description="Report execution engine for processing and delivering scheduled reports"
+    description="Report execution engine for processing and delivering scheduled reports",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -42,5 +41,5 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv('EXECUTION_API_PORT', 8000))
+    port = get_settings().execution_api_port
     uvicorn.run(app, host="0.0.0.0", port=port)
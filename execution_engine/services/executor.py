@@ -1,29 +1,31 @@
+import asyncio
 import uuid
 import os
+import orjson
 from datetime import datetime
-from typing import Optional, Dict
-from sqlalchemy.orm import Session
-from dotenv import load_dotenv
-
-# Load environment variables FIRST
-load_dotenv()
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple
+from sqlalchemy.orm import Session, lazyload, selectinload, undefer_group
 
 from shared.models import (
     ReportConfig, ReportDatasource, ReportSchedule,
-    ReportDelivery, ReportExecution
+    ReportDelivery, ReportExecution, ReportDeliveryLog, HEAVY, strict_loading_options
 )
 from shared.database import get_db_session
+from shared.settings import get_settings
 from shared.utils import now_jakarta
 from shared.logger import setup_logger, log_with_context
 from execution_engine.services.time_range_calculator import calculate_time_range, replace_template_variables
-from execution_engine.services.query_builder import apply_filters_to_query, build_auto_date_filter
-from execution_engine.connectors.mysql_connector import execute_query
+from execution_engine.services.query_builder import (
+    apply_filters_to_query, build_auto_date_filter, can_project_columns, insert_where_condition, project_columns
+)
+from execution_engine.connectors.mysql_connector import ChunkStream, execute_query, get_query_columns
 from execution_engine.services.format_converter import convert_to_format, get_file_size
 from execution_engine.deliverers.mailgun_deliverer import deliver_via_email
 from execution_engine.deliverers.sftp_deliverer import deliver_via_sftp
 
 # Secure path handling - REQUIRED environment variable
-_configured_path = os.getenv('REPORT_OUTPUT_PATH')
+_configured_path = get_settings().report_output_path
 if not _configured_path:
     raise RuntimeError("REPORT_OUTPUT_PATH environment variable is required but not set")
 
@@ -33,9 +35,169 @@ REPORT_OUTPUT_PATH = os.path.abspath(_configured_path)
 if not os.path.exists(REPORT_OUTPUT_PATH):
     os.makedirs(REPORT_OUTPUT_PATH, mode=0o755, exist_ok=True)
 
-# Setup structured logger (after load_dotenv)
+# Setup structured logger
 logger = setup_logger('executor')
 
+# Characters replaced in generated report file names (single pass via str.translate)
+_FILENAME_SANITIZE_TABLE = str.maketrans({' ': '_', '/': '_', ':': '-'})
+
+@lru_cache(maxsize=512)
+def _extract_filter_variables(filters_json: bytes) -> Tuple[Tuple[str, str], ...]:
+    """
+    Extract template variables from filter definitions
+
+    Cached on the serialized filters, which rarely change between runs
+    of the same scheduled report.
+
+    Args:
+        filters_json: orjson-serialized 'filters' list (sorted keys)
+
+    Returns:
+        tuple: (field_name, value) pairs, e.g. (('merchant_id', '123'),)
+    """
+    filter_variables = {}
+    for filter_def in orjson.loads(filters_json):
+        field = filter_def.get('field')
+        value = filter_def.get('value')
+        if field and value is not None:
+            # Extract field name (remove table prefix if exists)
+            # e.g., "ipg_trx_master.merchant_id" -> "merchant_id"
+            field_name = field.split('.')[-1] if '.' in field else field
+
+            # Convert value to string (handle lists for IN operator)
+            if isinstance(value, list):
+                filter_variables[field_name] = ', '.join(str(v) for v in value)
+            else:
+                filter_variables[field_name] = str(value)
+
+    return tuple(filter_variables.items())
+
+def _generate_file(
+    chunks: ChunkStream,
+    output_format: str,
+    output_path: str,
+    display_columns: Optional[List[str]] = None
+) -> int:
+    """
+    Write the streamed query result to the report file (blocking)
+
+    Args:
+        chunks: Arrow table chunk stream from execute_query
+        output_format: 'csv' or 'xlsx'
+        output_path: Full path of the file to write
+        display_columns: Columns to write, in order (None = all columns)
+
+    Returns:
+        int: Number of rows written
+    """
+    try:
+        return convert_to_format(chunks, output_format, output_path, display_columns)
+    finally:
+        # Release the datasource connection even if generation failed midway
+        chunks.close()
+
+def _begin_execution(
+    db: Session,
+    execution_id: str,
+    config_id: int,
+    schedule_id: Optional[int],
+    executed_by: str,
+    execution_start: datetime
+) -> ReportExecution:
+    """Mark the queued execution as running, or create it (blocking)"""
+    execution = db.query(ReportExecution).options(
+        *strict_loading_options()
+    ).filter_by(id=execution_id).first()
+
+    if execution:
+        # Update existing execution (from Kafka queue)
+        execution.status = 'running'
+        execution.started_at = execution_start
+    else:
+        # Create new execution
+        execution = ReportExecution(
+            id=execution_id,
+            config_id=config_id,
+            schedule_id=schedule_id,
+            status='running',
+            started_at=execution_start,
+            executed_by=executed_by
+        )
+        db.add(execution)
+
+    db.flush()
+    return execution
+
+def _load_report(
+    db: Session,
+    config_id: int,
+    schedule_id: Optional[int]
+) -> Tuple[ReportConfig, ReportDatasource, List[ReportDelivery], Optional[ReportSchedule]]:
+    """
+    Load everything the run reads: config, datasource, active deliveries, schedule (blocking)
+
+    Every column and relationship used later is loaded here, so the rest of
+    the run doesn't touch the database until the final commit.
+    """
+    # Schedules/deliveries are queried below with their own filters,
+    # so skip the selectin collection loads here
+    config = db.query(ReportConfig).options(
+        undefer_group(HEAVY),  # Query text and parameters are used below
+        lazyload(ReportConfig.schedules), lazyload(ReportConfig.deliveries)
+    ).filter_by(id=config_id, is_active=True).first()
+    if not config:
+        raise ValueError(f"Config {config_id} not found or inactive")
+
+    datasource = db.query(ReportDatasource).options(
+        undefer_group(HEAVY)
+    ).filter_by(id=config.datasource_id, is_active=True).first()
+    if not datasource:
+        raise ValueError(f"Datasource {config.datasource_id} not found or inactive")
+
+    deliveries = db.query(ReportDelivery).options(
+        undefer_group(HEAVY),  # delivery_config is read by every deliverer
+        selectinload(ReportDelivery.active_recipients),
+        lazyload(ReportDelivery.recipients)  # Inactive ones aren't needed
+    ).filter_by(config_id=config_id, is_active=True).all()
+
+    schedule = None
+    if schedule_id:
+        schedule = db.query(ReportSchedule).filter_by(id=schedule_id).first()
+
+    return config, datasource, deliveries, schedule
+
+def _flush_new(db: Session, objects: List) -> None:
+    """Add new rows and flush them so their ids are assigned (blocking)"""
+    db.add_all(objects)
+    db.flush()
+
+async def _dispatch_delivery(
+    delivery: ReportDelivery,
+    delivery_log: ReportDeliveryLog,
+    output_path: str,
+    execution_id: str,
+    config: ReportConfig,
+    time_range: Dict
+) -> int:
+    """Send the report through the deliverer for delivery.method, returns delivery_log_id"""
+    if delivery.method == 'email':
+        return await deliver_via_email(
+            delivery=delivery,
+            delivery_log=delivery_log,
+            file_path=output_path,
+            config=config,
+            time_range=time_range
+        )
+
+    return await deliver_via_sftp(
+        delivery=delivery,
+        delivery_log=delivery_log,
+        file_path=output_path,
+        execution_id=execution_id,
+        config=config,
+        time_range=time_range
+    )
+
 async def execute_report(
     config_id: int,
     schedule_id: Optional[int] = None,
@@ -76,114 +238,83 @@ async def execute_report(
 
     with get_db_session() as db:
         try:
+            # Session I/O runs on worker threads so other reports on the batch
+            # loop keep delivering; the session is only used by one thread at a time
             # STEP 1: Create or update execution record
-            execution = db.query(ReportExecution).filter_by(id=execution_id).first()
-
-            if execution:
-                # Update existing execution (from Kafka queue)
-                execution.status = 'running'
-                execution.started_at = execution_start
-            else:
-                # Create new execution
-                execution = ReportExecution(
-                    id=execution_id,
-                    config_id=config_id,
-                    schedule_id=schedule_id,
-                    status='running',
-                    started_at=execution_start,
-                    executed_by=executed_by
-                )
-                db.add(execution)
-
-            db.flush()
+            execution = await asyncio.to_thread(
+                _begin_execution, db, execution_id, config_id, schedule_id, executed_by, execution_start
+            )
 
             # STEP 2: Load configuration
             log_with_context(logger, 'info', 'Loading configuration',
                            execution_id=execution_id, config_id=config_id, stage='config_loading')
 
-            config = db.query(ReportConfig).filter_by(id=config_id, is_active=True).first()
-            if not config:
-                raise ValueError(f"Config {config_id} not found or inactive")
-
-            datasource = db.query(ReportDatasource).filter_by(id=config.datasource_id, is_active=True).first()
-            if not datasource:
-                raise ValueError(f"Datasource {config.datasource_id} not found or inactive")
+            config, datasource, deliveries, schedule = await asyncio.to_thread(
+                _load_report, db, config_id, schedule_id
+            )
 
-            deliveries = db.query(ReportDelivery).filter_by(config_id=config_id, is_active=True).all()
+            # Read report parameters once (JSON column, may be NULL)
+            params = config.parameters if isinstance(config.parameters, dict) else {}
+            filters_config = params.get('filters') or []
+            date_field = params.get('date_field')
+            filename_template = params.get('filename_template')
+            display_columns = params.get('display_columns')
 
             log_with_context(logger, 'info', 'Configuration loaded successfully',
                            execution_id=execution_id, config_id=config_id,
                            datasource=datasource.name, deliveries=len(deliveries), stage='config_loaded')
 
             # STEP 3: Calculate time range
-            schedule = None
-            if schedule_id:
-                schedule = db.query(ReportSchedule).filter_by(id=schedule_id).first()
-
             time_range = calculate_time_range(schedule, execution_start)
 
             # STEP 3b: Extract filter values to use as template variables in email
             # This allows using {{merchant_id}}, {{status}}, etc. in email subject/body
-            filter_variables = {}
-            if config.parameters and isinstance(config.parameters, dict):
-                filters_config = config.parameters.get('filters', [])
-                for filter_def in filters_config:
-                    field = filter_def.get('field')
-                    value = filter_def.get('value')
-                    if field and value is not None:
-                        # Extract field name (remove table prefix if exists)
-                        # e.g., "ipg_trx_master.merchant_id" -> "merchant_id"
-                        field_name = field.split('.')[-1] if '.' in field else field
-
-                        # Convert value to string (handle lists for IN operator)
-                        if isinstance(value, list):
-                            filter_variables[field_name] = ', '.join(str(v) for v in value)
-                        else:
-                            filter_variables[field_name] = str(value)
-
-            # Merge filter variables into time_range for template replacement
-            time_range.update(filter_variables)
+            if filters_config:
+                filter_variables = _extract_filter_variables(
+                    orjson.dumps(filters_config, option=orjson.OPT_SORT_KEYS)
+                )
+
+                # Merge filter variables into time_range for template replacement
+                time_range.update(filter_variables)
 
             # STEP 4: Build query with auto date filter and static filters
             base_query = config.report_query
 
             # Step 4a: Apply automatic date filter (if date_field specified)
-            if config.parameters and isinstance(config.parameters, dict):
-                date_field = config.parameters.get('date_field')
-                if date_field:
-                    # Build date filter from cron expression automatically
-                    cron_expr = schedule.cron_expression if schedule else None
-                    date_filter = build_auto_date_filter(date_field, time_range, cron_expr)
-
-                    if date_filter:
-                        # Check if query has WHERE clause
-                        query_upper = base_query.upper()
-                        has_where = 'WHERE' in query_upper
-
-                        # Find insertion point
-                        insertion_keywords = ['ORDER BY', 'LIMIT', 'GROUP BY', 'HAVING']
-                        insertion_pos = len(base_query)
-                        for keyword in insertion_keywords:
-                            pos = query_upper.find(keyword)
-                            if pos != -1 and pos < insertion_pos:
-                                insertion_pos = pos
-
-                        # Insert date filter
-                        if has_where:
-                            base_query = base_query[:insertion_pos].rstrip() + "\nAND " + date_filter + "\n" + base_query[insertion_pos:]
-                        else:
-                            base_query = base_query[:insertion_pos].rstrip() + "\nWHERE " + date_filter + "\n" + base_query[insertion_pos:]
+            if date_field:
+                # Build date filter from cron expression automatically
+                cron_expr = schedule.cron_expression if schedule else None
+                date_filter = build_auto_date_filter(date_field, time_range, cron_expr)
+
+                if date_filter:
+                    # Insert date filter before ORDER BY/LIMIT/etc
+                    base_query = insert_where_condition(base_query, date_filter)
 
             # Step 4b: Apply static filters from parameters (merchant_id, status, etc.)
-            if config.parameters and isinstance(config.parameters, dict):
-                filters_config = config.parameters.get('filters', [])
-                if filters_config:
-                    # Apply WHERE clause using pre-configured filter values
-                    base_query = apply_filters_to_query(base_query, filters_config, time_range)
+            if filters_config:
+                # Apply WHERE clause using pre-configured filter values
+                base_query = apply_filters_to_query(base_query, filters_config, time_range)
 
             # Step 4c: Replace any remaining template variables
             final_query = replace_template_variables(base_query, time_range)
 
+            # Step 4d: When display columns drop some of the query's columns, select
+            # only those in SQL so dropped columns are never fetched. Costs one
+            # LIMIT 0 probe round trip, so only tried for plain (unsorted,
+            # ungrouped) queries. The file writer still filters/orders by
+            # display_columns, which also covers the fallback
+            if display_columns and datasource.db_type == 'mysql' and can_project_columns(final_query):
+                try:
+                    available_columns = await asyncio.to_thread(
+                        get_query_columns, datasource, final_query, config.timeout_seconds or 300
+                    )
+                except Exception as e:
+                    # Not every query can be a derived table (e.g. duplicate output
+                    # names: MySQL error 1060); run it as written instead
+                    logger.warning(f"Column projection skipped, query can't be wrapped: {e}")
+                else:
+                    final_query = project_columns(final_query, display_columns, available_columns)
+
             # Log the execution context
             execution.execution_context = {
                 'original_query': config.report_query,
@@ -192,7 +323,33 @@ async def execute_report(
                 'datasource_type': datasource.db_type,
                 'output_format': config.output_format
             }
-            db.flush()
+
+            # Create output directory with execution_id (the root exists since import).
+            # Done before the query opens its streaming cursor, so nothing can fail
+            # between the query and file generation
+            output_dir = os.path.join(REPORT_OUTPUT_PATH, execution_id)
+            try:
+                os.mkdir(output_dir)
+            except FileExistsError:
+                pass  # Re-run of the same execution
+
+            # Generate filename with timestamp
+            file_extension = 'xlsx' if config.output_format == 'xlsx' else 'csv'
+
+            # Use custom filename template from parameters if set
+            if filename_template:
+                # Use custom template
+                file_name_base = replace_template_variables(filename_template, time_range)
+                # Sanitize filename
+                file_name_base = file_name_base.translate(_FILENAME_SANITIZE_TABLE)
+                file_name = f"{file_name_base}.{file_extension}"
+            else:
+                # Default format: ReportName_YYYYMMDD_HHMMSS.ext
+                timestamp_str = execution_start.strftime('%Y%m%d_%H%M%S')
+                safe_report_name = config.report_name.translate(_FILENAME_SANITIZE_TABLE)
+                file_name = f"{safe_report_name}_{timestamp_str}.{file_extension}"
+
+            output_path = os.path.join(output_dir, file_name)
 
             # STEP 5: Execute query
             log_with_context(logger, 'info', 'Executing database query',
@@ -203,100 +360,88 @@ async def execute_report(
             query_start = now_jakarta()
 
             if datasource.db_type == 'mysql':
-                df = execute_query(datasource, final_query, config.timeout_seconds or 300)
+                # Query runs here (off the event loop); rows are streamed while the file is written
+                chunks = await asyncio.to_thread(
+                    execute_query, datasource, final_query, config.timeout_seconds or 300
+                )
             else:
                 raise ValueError(f"Unsupported datasource type: {datasource.db_type}")
 
             query_time_ms = int((now_jakarta() - query_start).total_seconds() * 1000)
-            rows_returned = len(df)
 
             log_with_context(logger, 'info', 'Query executed successfully',
                            execution_id=execution_id, config_id=config_id,
-                           rows=rows_returned, duration_ms=query_time_ms, stage='query_completed')
+                           duration_ms=query_time_ms, stage='query_completed')
 
             # STEP 6: Convert to format
             log_with_context(logger, 'info', 'Generating report file',
                            execution_id=execution_id, config_id=config_id,
                            format=config.output_format, stage='file_generating')
 
-            # Create output directory with execution_id
-            output_dir = os.path.join(REPORT_OUTPUT_PATH, execution_id)
-            os.makedirs(output_dir, exist_ok=True)
+            # Convert to format (consumes the row stream, keeping display columns).
+            # Runs on a worker thread so concurrent deliveries/executions keep going
+            rows_returned = await asyncio.to_thread(
+                _generate_file, chunks, config.output_format, output_path, display_columns
+            )
 
-            # Generate filename with timestamp
-            file_extension = 'xlsx' if config.output_format == 'xlsx' else 'csv'
-
-            # Check for custom filename template in parameters
-            filename_template = None
-            if config.parameters and isinstance(config.parameters, dict):
-                filename_template = config.parameters.get('filename_template')
-
-            if filename_template:
-                # Use custom template
-                file_name_base = replace_template_variables(filename_template, time_range)
-                # Sanitize filename
-                file_name_base = file_name_base.replace(' ', '_').replace('/', '_').replace(':', '-')
-                file_name = f"{file_name_base}.{file_extension}"
-            else:
-                # Default format: ReportName_YYYYMMDD_HHMMSS.ext
-                timestamp_str = execution_start.strftime('%Y%m%d_%H%M%S')
-                safe_report_name = config.report_name.replace(' ', '_').replace('/', '_')
-                file_name = f"{safe_report_name}_{timestamp_str}.{file_extension}"
-
-            output_path = os.path.join(output_dir, file_name)
-
-            # Get display columns from parameters (if specified)
-            display_columns = None
-            if config.parameters and isinstance(config.parameters, dict):
-                display_columns = config.parameters.get('display_columns')
-
-            # Convert to format with column filtering
-            convert_to_format(df, config.output_format, output_path, display_columns)
             file_size = get_file_size(output_path)
 
             log_with_context(logger, 'info', 'Report file generated successfully',
                            execution_id=execution_id, config_id=config_id,
-                           file_path=output_path, file_size_bytes=file_size, stage='file_generated')
+                           rows=rows_returned, file_path=output_path,
+                           file_size_bytes=file_size, stage='file_generated')
 
             # Update execution with query results
             execution.query_execution_time_ms = query_time_ms
             execution.rows_returned = rows_returned
             execution.file_generated_path = output_path
             execution.file_size_bytes = file_size
-            db.flush()
 
             # STEP 7: Deliver to recipients
             log_with_context(logger, 'info', 'Starting delivery to recipients',
                            execution_id=execution_id, config_id=config_id,
                            deliveries=len(deliveries), stage='delivery_starting')
 
-            delivery_count = 0
+            supported_deliveries = []
             for delivery in deliveries:
-                if delivery.method == 'email':
-                    deliver_via_email(
-                        db=db,  # Pass the shared database session
-                        delivery=delivery,
-                        file_path=output_path,
-                        execution_id=execution_id,
-                        config=config,
-                        time_range=time_range,
-                        schedule_id=schedule_id
-                    )
-                    delivery_count += 1
-                elif delivery.method == 'sftp':
-                    deliver_via_sftp(
-                        db=db,  # Pass the shared database session
-                        delivery=delivery,
-                        file_path=output_path,
-                        execution_id=execution_id,
-                        config=config,
-                        time_range=time_range,
-                        schedule_id=schedule_id
-                    )
-                    delivery_count += 1
+                if delivery.method in ('email', 'sftp'):
+                    supported_deliveries.append(delivery)
                 else:
                     logger.warning(f"Unsupported delivery method: {delivery.method}")
 
+            # Create all pending delivery logs in a single flush; deliverers
+            # fill them in and the final statuses go out with the commit
+            sent_at = now_jakarta()
+            delivery_logs = [
+                ReportDeliveryLog(
+                    config_id=config.id,
+                    delivery_id=delivery.id,
+                    schedule_id=schedule_id,
+                    execution_id=execution_id,
+                    status='pending',
+                    sent_at=sent_at
+                )
+                for delivery in supported_deliveries
+            ]
+            if delivery_logs:
+                await asyncio.to_thread(_flush_new, db, delivery_logs)
+
+            # Run deliveries concurrently (each delivery records its own success/failure);
+            # an unexpected error in one doesn't cancel the others
+            results = await asyncio.gather(
+                *[
+                    _dispatch_delivery(delivery, delivery_log, output_path, execution_id, config, time_range)
+                    for delivery, delivery_log in zip(supported_deliveries, delivery_logs)
+                ],
+                return_exceptions=True
+            )
+            delivery_count = 0
+            for delivery, result in zip(supported_deliveries, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Delivery {delivery.id} ({delivery.method}) raised: {result}")
+                else:
+                    delivery_count += 1
+
             log_with_context(logger, 'info', 'Delivery completed',
                            execution_id=execution_id, config_id=config_id,
                            deliveries_sent=delivery_count, stage='delivery_completed')
@@ -304,14 +449,13 @@ async def execute_report(
             # STEP 8: Update execution record
             execution.status = 'completed'
             execution.completed_at = now_jakarta()
-            db.flush()
 
             # STEP 9: Update schedule last_run_at
             if schedule:
                 schedule.last_run_at = execution_start
-                db.flush()
 
-            db.commit()
+            # Pending changes (context, results, delivery statuses) go out with the commit
+            await asyncio.to_thread(db.commit)
 
             # Return execution details
             total_time_ms = int((now_jakarta() - execution_start).total_seconds() * 1000)
@@ -343,7 +487,7 @@ async def execute_report(
                     execution.status = 'failed'
                     execution.completed_at = now_jakarta()
                     execution.error_message = str(e)
-                    db.commit()
+                    await asyncio.to_thread(db.commit)
             except:
                 pass  # Ignore errors during error handling
 
@@ -1,64 +1,185 @@
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import os
+import xlsxwriter
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Iterable
 
-def filter_display_columns(df: pd.DataFrame, display_columns: Optional[List[str]] = None) -> pd.DataFrame:
+# Same display formats pandas.to_excel uses
+XLSX_DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+XLSX_DATE_FORMAT = 'yyyy-mm-dd'
+
+def filter_display_columns(table: pa.Table, display_columns: Optional[List[str]] = None) -> pa.Table:
     """
-    Filter DataFrame to only include specified display columns
+    Filter table to only include specified display columns
 
     Args:
-        df: pandas DataFrame with all query results
+        table: pyarrow Table with all query results
         display_columns: List of column names to include in output (None = all columns)
 
     Returns:
-        pandas.DataFrame with only specified columns
+        pyarrow.Table with only specified columns
     """
     if not display_columns:
-        return df
+        return table
 
-    # Only include columns that exist in the DataFrame
-    valid_columns = [col for col in display_columns if col in df.columns]
+    # Only include columns that exist in the table (set lookup, keeps display order)
+    existing_columns = set(table.column_names)
+    valid_columns = [col for col in display_columns if col in existing_columns]
 
     if not valid_columns:
         # If no valid columns, return all
-        return df
+        return table
 
-    return df[valid_columns]
+    return table.select(valid_columns)
 
 def convert_to_format(
-    df: pd.DataFrame,
+    chunks: Iterable[pa.Table],
     output_format: str,
     output_path: str,
     display_columns: Optional[List[str]] = None
-) -> str:
+) -> int:
     """
-    Convert pandas DataFrame to specified format with optional column filtering
+    Write streamed Arrow table chunks to specified format with optional column filtering
 
     Args:
-        df: pandas DataFrame with query results
+        chunks: Iterable of pyarrow Table chunks with query results
         output_format: 'csv' or 'xlsx'
-        output_path: Full path where file should be saved
+        output_path: Full path where file should be saved (directory must exist)
         display_columns: Optional list of columns to include in output
 
     Returns:
-        str: Path to generated file
+        int: Number of data rows written
     """
 
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if output_format not in ('csv', 'xlsx'):
+        raise ValueError(f"Unsupported format: {output_format}. Use 'csv' or 'xlsx'")
 
-    # Filter to display columns if specified
-    df_output = filter_display_columns(df, display_columns)
+    rows_written = 0
 
     if output_format == 'csv':
-        df_output.to_csv(output_path, index=False, encoding='utf-8')
-    elif output_format == 'xlsx':
-        df_output.to_excel(output_path, index=False, engine='openpyxl')
+        # Arrow's native CSV writer (UTF-8); each chunk is appended to one file
+        with open(output_path, 'wb') as f:
+            for index, chunk in enumerate(chunks):
+                # Filter to display columns if specified
+                table = filter_display_columns(chunk, display_columns)
+                # Header only once, before the first chunk
+                pacsv.write_csv(
+                    _to_csv_table(table),
+                    f,
+                    write_options=pacsv.WriteOptions(include_header=(index == 0))
+                )
+                rows_written += table.num_rows
     else:
-        raise ValueError(f"Unsupported format: {output_format}. Use 'csv' or 'xlsx'")
+        rows_written = _write_xlsx(chunks, output_path, display_columns)
+
+    return rows_written
+
+def _format_duration(value: timedelta) -> str:
+    """Format a MySQL TIME value (returned as timedelta) as [-]HH:MM:SS[.ffffff]"""
+    total_us = (value.days * 86400 + value.seconds) * 1_000_000 + value.microseconds
+    sign = '-' if total_us < 0 else ''
+    seconds, microseconds = divmod(abs(total_us), 1_000_000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    text = f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{text}.{microseconds:06d}" if microseconds else text
+
+def _format_binary(value: bytes) -> str:
+    """Text of a BINARY/BLOB value: as-is if valid UTF-8, else 0x-prefixed hex"""
+    try:
+        return value.decode('utf-8')
+    except UnicodeDecodeError:
+        return '0x' + value.hex()
+
+def _cell_text(value):
+    """Text for values the writers can't output directly (TIME, binary)"""
+    if isinstance(value, timedelta):
+        return _format_duration(value)
+    return _format_binary(value)
+
+def _is_text_only(data_type: pa.DataType) -> bool:
+    """Arrow types written through _cell_text"""
+    return (pa.types.is_duration(data_type) or pa.types.is_binary(data_type)
+            or pa.types.is_large_binary(data_type) or pa.types.is_fixed_size_binary(data_type))
+
+def _to_csv_table(table: pa.Table) -> pa.Table:
+    """
+    Prepare a chunk for CSV output
+
+    Timestamps are narrowed to whole seconds when that loses nothing, so
+    DATETIME columns print as 'YYYY-MM-DD HH:MM:SS' (no '.000000' suffix).
+    TIME and binary columns are written as text (see _cell_text).
+    """
+    for index, field in enumerate(table.schema):
+        if _is_text_only(field.type):
+            column = pa.array(
+                [None if value is None else _cell_text(value) for value in table.column(index).to_pylist()],
+                type=pa.string()
+            )
+            table = table.set_column(index, field.name, column)
+        elif pa.types.is_timestamp(field.type) and field.type.unit != 's':
+            try:
+                column = table.column(index).cast(pa.timestamp('s', tz=field.type.tz))
+            except pa.ArrowInvalid:
+                continue  # Has sub-second values, keep full precision
+            table = table.set_column(index, field.name, column)
+
+    return table
+
+def _write_xlsx(
+    chunks: Iterable[pa.Table],
+    output_path: str,
+    display_columns: Optional[List[str]] = None
+) -> int:
+    """
+    Stream Arrow table chunks to an xlsx file row by row
+
+    xlsxwriter's constant_memory mode flushes each row to disk once the next
+    row starts, so memory stays flat regardless of report size. Cell values
+    are written as-is (no URL or formula conversion).
+
+    Returns:
+        int: Number of data rows written
+    """
+    workbook = xlsxwriter.Workbook(output_path, {
+        'constant_memory': True,
+        'default_date_format': XLSX_DATETIME_FORMAT,
+        'remove_timezone': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False
+    })
+    try:
+        worksheet = workbook.add_worksheet()
+        header_format = workbook.add_format({'bold': True})
+        date_format = workbook.add_format({'num_format': XLSX_DATE_FORMAT})
+
+        rows_written = 0
+        for index, chunk in enumerate(chunks):
+            table = filter_display_columns(chunk, display_columns)
+
+            if index == 0:
+                worksheet.write_row(0, 0, [str(col) for col in table.column_names], header_format)
+
+            columns = [column.to_pylist() for column in table.columns]
+            for record in zip(*columns):
+                rows_written += 1
+                for col, value in enumerate(record):
+                    if value is None:
+                        continue  # Leave NULLs as empty cells
+                    if isinstance(value, float) and value != value:
+                        continue  # NaN
+                    if isinstance(value, date) and not isinstance(value, datetime):
+                        worksheet.write_datetime(rows_written, col, value, date_format)
+                    elif isinstance(value, (timedelta, bytes)):
+                        worksheet.write_string(rows_written, col, _cell_text(value))
+                    else:
+                        worksheet.write(rows_written, col, value)
+    finally:
+        workbook.close()
 
-    return output_path
+    return rows_written
 
 def get_file_size(file_path: str) -> int:
     """Get file size in bytes"""
@@ -1,4 +1,35 @@
-from typing import Dict, List, Any, Optional
+import re
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+from execution_engine.services.time_range_calculator import replace_template_variables
+
+# First clause a filter must go before, and an existing WHERE ahead of it
+_INSERTION_RE = re.compile(r'\b(ORDER\s+BY|LIMIT|GROUP\s+BY|HAVING)\b', re.IGNORECASE)
+_HAS_WHERE_RE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+# Clauses that rule out wrapping a query to project columns: ORDER BY isn't
+# guaranteed to survive a derived table (MariaDB drops it, MySQL only keeps it
+# when the derived table is merged), and GROUP BY/DISTINCT/UNION results are
+# materialized anyway, so dropping columns outside saves the server nothing
+_NO_PROJECTION_RE = re.compile(r'\b(ORDER\s+BY|GROUP\s+BY|DISTINCT|UNION)\b', re.IGNORECASE)
+
+# Field names that look like dates (DATE(...), created_at, order_date, ...)
+_DATE_FIELD_RE = re.compile(
+    r'DATE\(|TIMESTAMP\(|created_at|updated_at|deleted_at|date_|_date|datetime|time_',
+    re.IGNORECASE
+)
+
+# Granularity of the most common schedules (macros map like their 5-field form)
+_CRON_FASTPATH = {
+    '0 * * * *': 'hourly',
+    '0 0 * * *': 'daily',
+    '@hourly': 'hourly',
+    '@daily': 'daily',
+    '@midnight': 'daily',
+    '@weekly': 'weekly',
+    '@monthly': 'monthly',
+}
+_SUB_HOURLY_CRON_RE = re.compile(r'\*/\d+ \* \* \* \*$')
 
 def is_date_filter(filter_def: Dict) -> bool:
     """
@@ -7,43 +38,24 @@ def is_date_filter(filter_def: Dict) -> bool:
     Date filters should be in the query using template variables like {{yesterday}}
     NOT in parameters.filters
     """
-    data_type = filter_def.get('type', 'string')
-    field = filter_def.get('field', '')
+    return _is_date_field(filter_def.get('type', 'string'), filter_def.get('field', ''))
 
+@lru_cache(maxsize=1024)
+def _is_date_field(data_type: str, field: str) -> bool:
+    """Date check for one (type, field) pair, cached since the same fields recur across runs"""
     # Skip if explicitly marked as date type
     if data_type == 'date':
         return True
 
     # Skip if field contains common date patterns
-    date_patterns = [
-        'DATE(',
-        'TIMESTAMP(',
-        'created_at',
-        'updated_at',
-        'deleted_at',
-        'date_',
-        '_date',
-        'datetime',
-        'time_'
-    ]
-
-    field_lower = field.lower()
-    for pattern in date_patterns:
-        if pattern.lower() in field_lower:
-            return True
-
-    return False
+    return _DATE_FIELD_RE.search(field) is not None
 
-def build_where_clause(filters: List[Dict], template_vars: Dict[str, Any] = None) -> str:
-    """
-    Build WHERE clause from pre-configured filter values
+def _escape_sql_string(value: Any) -> str:
+    """Escape a value for use inside a single-quoted MySQL string literal"""
+    return str(value).replace('\\', '\\\\').replace("'", "''")
 
-    IMPORTANT: Date filters are SKIPPED - dates should be in query using {{yesterday}}, {{start_date}}, etc.
-    """
-    if not filters:
-        return ""
-
-    template_vars = template_vars or {}
+def _build_conditions(filters: List[Dict], template_vars: Optional[Dict[str, Any]]) -> List[str]:
+    """Build one SQL condition per non-date filter (shared by both filter entry points)"""
     where_conditions = []
 
     for filter_def in filters:
@@ -59,109 +71,177 @@ def build_where_clause(filters: List[Dict], template_vars: Dict[str, Any] = None
         if value is None:
             continue
 
-        # Replace template variables
-        if isinstance(value, str):
-            for var_name, var_value in template_vars.items():
-                value = value.replace(f'{{{{{var_name}}}}}', str(var_value))
+        # Replace template variables (single regex pass over the value)
+        if isinstance(value, str) and template_vars:
+            value = replace_template_variables(value, template_vars)
 
-        # Build condition
+        # Build condition (string literals escaped)
         if operator in ['=', '!=', '>', '>=', '<', '<=']:
             if data_type == 'number':
                 condition = f"{field} {operator} {value}"
             else:
-                condition = f"{field} {operator} '{value}'"
+                condition = f"{field} {operator} '{_escape_sql_string(value)}'"
         elif operator == 'LIKE':
-            condition = f"{field} LIKE '%{value}%'"
+            condition = f"{field} LIKE '%{_escape_sql_string(value)}%'"
         elif operator == 'IN':
             if isinstance(value, list):
-                quoted_values = [f"'{v}'" for v in value]
-                condition = f"{field} IN ({', '.join(quoted_values)})"
+                condition = f"{field} IN ('" + "', '".join(_escape_sql_string(v) for v in value) + "')"
             else:
-                condition = f"{field} = '{value}'"
+                condition = f"{field} = '{_escape_sql_string(value)}'"
         else:
-            condition = f"{field} = '{value}'"
+            condition = f"{field} = '{_escape_sql_string(value)}'"
 
         where_conditions.append(condition)
 
+    return where_conditions
+
+def build_where_clause(filters: List[Dict], template_vars: Dict[str, Any] = None) -> str:
+    """
+    Build WHERE clause from pre-configured filter values
+
+    IMPORTANT: Date filters are SKIPPED - dates should be in query using {{yesterday}}, {{start_date}}, etc.
+    """
+    if not filters:
+        return ""
+
+    where_conditions = _build_conditions(filters, template_vars)
+
     if where_conditions:
         return "WHERE " + " AND ".join(where_conditions)
     return ""
 
-def apply_filters_to_query(base_query: str, filters: List[Dict], template_vars: Dict[str, Any] = None) -> str:
+@lru_cache(maxsize=256)
+def _analyze_query(base_query: str) -> Tuple[int, bool]:
     """
-    Apply pre-configured filters to base query
+    Find where filters go in a query and whether it already has a WHERE
 
-    If query already has WHERE clause, append with AND
-    If query doesn't have WHERE clause, add WHERE
+    Cached per query text: a config's report query is the same on every run.
     """
-    # Build filter conditions (without WHERE keyword)
-    where_conditions = []
+    match = _INSERTION_RE.search(base_query)
+    insertion_pos = match.start() if match else len(base_query)
+    has_where = _HAS_WHERE_RE.search(base_query, 0, insertion_pos) is not None
+    return insertion_pos, has_where
 
-    for filter_def in filters:
-        # SKIP DATE FILTERS
-        if is_date_filter(filter_def):
-            continue
+def insert_where_condition(base_query: str, condition: str) -> str:
+    """
+    Insert a condition into query's WHERE clause
 
-        field = filter_def.get('field')
-        operator = filter_def.get('operator', '=')
-        data_type = filter_def.get('type', 'string')
-        value = filter_def.get('value')
+    Goes before ORDER BY/LIMIT/GROUP BY/HAVING; appended with AND if the query
+    already has a WHERE, otherwise starts a new WHERE clause.
+    """
+    insertion_pos, has_where = _analyze_query(base_query)
 
-        if value is None:
-            continue
+    keyword = "AND" if has_where else "WHERE"
+    return base_query[:insertion_pos].rstrip() + f"\n{keyword} " + condition + "\n" + base_query[insertion_pos:]
 
-        # Replace template variables
-        if isinstance(value, str) and template_vars:
-            for var_name, var_value in template_vars.items():
-                value = value.replace(f'{{{{{var_name}}}}}', str(var_value))
+def select_from_subquery(base_query: str, columns: Optional[List[str]] = None, limit: Optional[int] = None) -> str:
+    """
+    Wrap query as a derived table and select from it
 
-        # Build condition
-        if operator in ['=', '!=', '>', '>=', '<', '<=']:
-            if data_type == 'number':
-                condition = f"{field} {operator} {value}"
-            else:
-                condition = f"{field} {operator} '{value}'"
-        elif operator == 'LIKE':
-            condition = f"{field} LIKE '%{value}%'"
-        elif operator == 'IN':
-            if isinstance(value, list):
-                quoted_values = [f"'{v}'" for v in value]
-                condition = f"{field} IN ({', '.join(quoted_values)})"
-            else:
-                condition = f"{field} = '{value}'"
-        else:
-            condition = f"{field} = '{value}'"
+    Lets the database drop unused columns before they're sent over the wire,
+    without touching the original query text.
 
-        where_conditions.append(condition)
+    Args:
+        base_query: Full report query
+        columns: Column names to select (None = all columns)
+        limit: Optional LIMIT for the outer SELECT
 
-    # If no conditions to add, return original query
-    if not where_conditions:
-        return base_query
+    Returns:
+        str: SELECT ... FROM (<base_query>) AS _sub [LIMIT n]
+    """
+    # A trailing semicolon is valid on its own but not inside parentheses
+    inner_query = base_query.strip().rstrip(';')
+
+    if columns:
+        projection = ", ".join("`" + column.replace("`", "``") + "`" for column in columns)
+    else:
+        projection = "*"
 
-    # Check if query already has WHERE clause
-    query_upper = base_query.upper()
-    has_where = 'WHERE' in query_upper
+    query = f"SELECT {projection} FROM (\n{inner_query}\n) AS _sub"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query
 
-    # Find insertion point (before ORDER BY, LIMIT, GROUP BY, HAVING)
-    insertion_keywords = ['ORDER BY', 'LIMIT', 'GROUP BY', 'HAVING']
-    insertion_pos = len(base_query)
+def can_project_columns(query: str) -> bool:
+    """
+    Check whether a query may be wrapped to select only some of its columns
 
-    for keyword in insertion_keywords:
-        pos = query_upper.find(keyword)
-        if pos != -1 and pos < insertion_pos:
-            insertion_pos = pos
+    Errs on the side of not wrapping: any ORDER BY/GROUP BY/DISTINCT/UNION in
+    the text (subqueries included) disables projection.
+    """
+    return _NO_PROJECTION_RE.search(query) is None
 
-    # Build the filter clause
-    if has_where:
-        # Append with AND
-        filter_clause = "AND " + " AND ".join(where_conditions)
-    else:
-        # Add new WHERE clause
-        filter_clause = "WHERE " + " AND ".join(where_conditions)
+def project_columns(query: str, display_columns: List[str], available_columns: List[str]) -> str:
+    """
+    Wrap query to fetch only the display columns, when that is safe and drops something
 
-    # Insert filters before ORDER BY/LIMIT/etc
-    return base_query[:insertion_pos].rstrip() + "\n" + filter_clause + "\n" + base_query[insertion_pos:]
+    Args:
+        query: Final report query
+        display_columns: Columns the report shows, in order
+        available_columns: Result columns of query (from a LIMIT 0 probe)
+
+    Returns:
+        str: Projected query, or query unchanged
+    """
+    if not can_project_columns(query):
+        return query
+
+    # Unknown names are skipped; if none match, the report keeps all columns
+    available = set(available_columns)
+    projected_columns = [c for c in display_columns if c in available]
+    if not projected_columns or len(set(projected_columns)) == len(available):
+        return query
+
+    return select_from_subquery(query, projected_columns)
+
+def apply_filters_to_query(base_query: str, filters: List[Dict], template_vars: Dict[str, Any] = None) -> str:
+    """
+    Apply pre-configured filters to base query
 
+    If query already has WHERE clause, append with AND
+    If query doesn't have WHERE clause, add WHERE
+    """
+    # Build filter conditions (without WHERE keyword)
+    where_conditions = _build_conditions(filters, template_vars)
+
+    # If no conditions to add, return original query
+    if not where_conditions:
+        return base_query
+
+    # Insert filters before ORDER BY/LIMIT/etc (AND onto existing WHERE)
+    return insert_where_condition(base_query, " AND ".join(where_conditions))
+
+
+def _cron_granularity(cron_expression: str) -> str:
+    """Classify a cron expression as hourly/sub_hourly/daily/weekly/monthly"""
+    # Common schedules skip the field-by-field checks
+    cron_expression = cron_expression.strip()
+    granularity = _CRON_FASTPATH.get(cron_expression)
+    if granularity:
+        return granularity
+    if _SUB_HOURLY_CRON_RE.match(cron_expression):
+        return 'sub_hourly'
+
+    parts = cron_expression.split()
+    if len(parts) < 5:
+        return 'daily'  # default
+
+    minute, hour, day, month, weekday = parts[:5]
+
+    # Hourly: minute is fixed, hour is *
+    if minute != '*' and hour == '*':
+        return 'hourly'
+    # Sub-hourly: minute has */N pattern
+    elif minute.startswith('*/'):
+        return 'sub_hourly'
+    # Weekly: weekday is specific
+    elif weekday != '*':
+        return 'weekly'
+    # Monthly: day is 1
+    elif day == '1' and month == '*':
+        return 'monthly'
+    # Daily: default
+    return 'daily'
 
 def build_auto_date_filter(date_field: str, time_range: Dict, cron_expression: Optional[str] = None) -> str:
     """
@@ -183,28 +263,7 @@ def build_auto_date_filter(date_field: str, time_range: Dict, cron_expression: O
         return ""
 
     # Detect granularity from cron expression
-    granularity = 'daily'  # default
-
-    if cron_expression:
-        parts = cron_expression.split()
-        if len(parts) >= 5:
-            minute, hour, day, month, weekday = parts[:5]
-
-            # Hourly: minute is fixed, hour is *
-            if minute != '*' and hour == '*':
-                granularity = 'hourly'
-            # Sub-hourly: minute has */N pattern
-            elif minute.startswith('*/'):
-                granularity = 'sub_hourly'
-            # Weekly: weekday is specific
-            elif weekday != '*':
-                granularity = 'weekly'
-            # Monthly: day is 1
-            elif day == '1' and month == '*':
-                granularity = 'monthly'
-            # Daily: default
-            else:
-                granularity = 'daily'
+    granularity = _cron_granularity(cron_expression) if cron_expression else 'daily'
 
     # Build filter based on granularity
     if granularity == 'daily':
@@ -1,8 +1,55 @@
+import re
 from croniter import croniter
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Optional
+from zoneinfo import ZoneInfo
 from shared.models import ReportSchedule
-import pytz
+
+# Any {{name}} placeholder; the name is looked up in the variables dict
+_TEMPLATE_VAR_RE = re.compile(r"\{\{(.*?)\}\}")
+
+# Fixed-period schedules: previous run is exactly one period before the last one
+# (times are naive, so there are no DST jumps to account for)
+_CRON_PERIODS = {
+    '@hourly': timedelta(hours=1),
+    '@daily': timedelta(days=1),
+    '@midnight': timedelta(days=1),
+    '@weekly': timedelta(weeks=1),
+}
+_HOURLY_CRON_RE = re.compile(r'[0-5]?\d \* \* \* \*')
+_DAILY_CRON_RE = re.compile(r'[0-5]?\d (?:[01]?\d|2[0-3]) \* \* \*')
+_WEEKLY_CRON_RE = re.compile(r'[0-5]?\d (?:[01]?\d|2[0-3]) \* \* [0-7]')
+_SUB_HOURLY_CRON_RE = re.compile(r'\*/(\d+) \* \* \* \*')
+
+@lru_cache(maxsize=64)
+def _get_timezone(name: str) -> ZoneInfo:
+    """Schedule timezone by IANA name (raises if unknown)"""
+    return ZoneInfo(name)
+
+@lru_cache(maxsize=256)
+def _cron_period(cron_expression: str) -> Optional[timedelta]:
+    """Interval between runs for common fixed-period crons, None if it varies or is unknown"""
+    cron_expression = ' '.join(cron_expression.split())
+
+    period = _CRON_PERIODS.get(cron_expression)
+    if period:
+        return period
+    if _HOURLY_CRON_RE.fullmatch(cron_expression):
+        return timedelta(hours=1)
+    if _DAILY_CRON_RE.fullmatch(cron_expression):
+        return timedelta(days=1)
+    if _WEEKLY_CRON_RE.fullmatch(cron_expression):
+        return timedelta(weeks=1)
+
+    match = _SUB_HOURLY_CRON_RE.fullmatch(cron_expression)
+    if match:
+        step = int(match.group(1))
+        # Only steps that divide the hour are evenly spaced across hour boundaries
+        if 0 < step <= 60 and 60 % step == 0:
+            return timedelta(minutes=step)
+
+    return None
 
 def calculate_time_range(schedule: Optional[ReportSchedule], execution_time: datetime) -> Dict[str, str]:
     """
@@ -32,14 +79,11 @@ def calculate_time_range(schedule: Optional[ReportSchedule], execution_time: dat
     # Keep times naive (no tzinfo) since MySQL stores them without timezone
     if schedule and schedule.timezone:
         try:
-            tz = pytz.timezone(schedule.timezone)
-            if execution_time.tzinfo is None:
-                # Localize to timezone first, then remove tzinfo
-                execution_time = tz.localize(execution_time)
-            else:
-                execution_time = execution_time.astimezone(tz)
-            # Remove tzinfo to keep it naive for MySQL
-            execution_time = execution_time.replace(tzinfo=None)
+            tz = _get_timezone(schedule.timezone)
+            if execution_time.tzinfo is not None:
+                # Convert, then remove tzinfo to keep it naive for MySQL
+                # (naive times are already taken as schedule-local)
+                execution_time = execution_time.astimezone(tz).replace(tzinfo=None)
         except:
             pass  # Use as-is if timezone invalid
 
@@ -55,7 +99,9 @@ def calculate_time_range(schedule: Optional[ReportSchedule], execution_time: dat
         try:
             cron = croniter(schedule.cron_expression, execution_time)
             end = cron.get_prev(datetime)    # Most recent scheduled time BEFORE now
-            start = cron.get_prev(datetime)  # The scheduled time BEFORE that
+            # The scheduled time BEFORE that; fixed-period crons skip the second scan
+            period = _cron_period(schedule.cron_expression)
+            start = end - period if period else cron.get_prev(datetime)
             method = 'cron_detection'
         except Exception:
             # Fallback to daily if cron parsing fails
@@ -102,13 +148,15 @@ def replace_template_variables(query: str, time_range: Dict[str, str]) -> str:
     - {{yesterday}}, {{last_week}}, {{last_month}}
     - {{execution_time}}, {{execution_date}}
     """
+    if not time_range:
+        return query
 
-    final_query = query
-
-    for key, value in time_range.items():
-        placeholder = f"{{{{{key}}}}}"
+    def _substitute(match) -> str:
+        name = match.group(1)
+        if name not in time_range:
+            return match.group(0)  # Unknown placeholder, leave as-is
+        value = time_range[name]
         # Convert value to string if it's not already
-        str_value = str(value) if not isinstance(value, str) else value
-        final_query = final_query.replace(placeholder, str_value)
+        return value if isinstance(value, str) else str(value)
 
-    return final_query
+    return _TEMPLATE_VAR_RE.sub(_substitute, query)
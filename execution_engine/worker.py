@@ -10,11 +10,8 @@ Usage:
 
 import asyncio
 import sys
+from collections import OrderedDict
 from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables FIRST (before any imports that use logger)
-load_dotenv()
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -22,12 +19,37 @@ sys.path.append(str(Path(__file__).parent.parent))
 from execution_engine.kafka_consumer import ReportKafkaConsumer
 from execution_engine.services.executor import execute_report
 from shared.logger import setup_logger, log_with_context
+from sqlalchemy import select
+from shared.database import engine
+from shared.models import ReportExecution
 
-# Setup structured logger (after load_dotenv)
+# Setup structured logger
 logger = setup_logger('worker')
 
+# Recently completed execution ids, so redelivered messages skip the DB check
+COMPLETED_CACHE_SIZE = 2048
+_completed_executions: "OrderedDict[str, None]" = OrderedDict()
+
+
+def _remember_completed(execution_id: str):
+    """Add execution id to the in-process LRU of completed executions"""
+    _completed_executions[execution_id] = None
+    _completed_executions.move_to_end(execution_id)
+    if len(_completed_executions) > COMPLETED_CACHE_SIZE:
+        _completed_executions.popitem(last=False)
+
 
-def process_execution_request(message_data: dict):
+def _is_already_completed(execution_id: str) -> bool:
+    """Check whether an execution record is already completed"""
+    # Core select of the status column: no session, identity map or ORM row
+    with engine.connect() as conn:
+        status = conn.execute(
+            select(ReportExecution.status).where(ReportExecution.id == execution_id)
+        ).scalar()
+    return status == 'completed'
+
+
+async def process_execution_request(message_data: dict):
     """
     Process a report execution request from Kafka
 
@@ -51,23 +73,27 @@ def process_execution_request(message_data: dict):
                      schedule_id=schedule_id, executed_by=executed_by)
 
     # IDEMPOTENCY CHECK: Prevent duplicate processing
-    from shared.database import get_db_session
-    from shared.models import ReportExecution
-
-    with get_db_session() as db:
-        existing = db.query(ReportExecution).filter_by(id=execution_id).first()
-        if existing and existing.status == 'completed':
-            logger.warning(f"⚠️ Execution {execution_id} already completed - skipping duplicate")
-            return {'status': 'skipped', 'reason': 'already_completed', 'execution_id': execution_id}
+    # In-process hit first; otherwise a sync DB call, run off the event loop
+    # so batch-mates keep running
+    if execution_id in _completed_executions:
+        _completed_executions.move_to_end(execution_id)
+        logger.warning(f"⚠️ Execution {execution_id} already completed - skipping duplicate")
+        return {'status': 'skipped', 'reason': 'already_completed', 'execution_id': execution_id}
+
+    if await asyncio.to_thread(_is_already_completed, execution_id):
+        _remember_completed(execution_id)
+        logger.warning(f"⚠️ Execution {execution_id} already completed - skipping duplicate")
+        return {'status': 'skipped', 'reason': 'already_completed', 'execution_id': execution_id}
 
     try:
         # Execute report asynchronously
-        result = asyncio.run(execute_report(
+        result = await execute_report(
             config_id=config_id,
             schedule_id=schedule_id,
             executed_by=executed_by,
             execution_id=execution_id  # Pass execution_id to reuse the existing record
-        ))
+        )
+        _remember_completed(result['execution_id'])
 
         duration_ms = result.get('total_execution_time_ms', 0)
         log_with_context(logger, 'info', '✅ Execution completed successfully',
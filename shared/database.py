@@ -1,17 +1,18 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from contextlib import contextmanager
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import AsyncIterator
+import orjson
+from shared.settings import get_settings
+from shared.utils import make_engine
 
 # Database configuration (required from environment)
-DB_HOST = os.getenv('DB_HOST')
-DB_PORT = os.getenv('DB_PORT')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_NAME = os.getenv('DB_NAME')
+settings = get_settings()
+DB_HOST = settings.db_host
+DB_PORT = settings.db_port
+DB_USER = settings.db_user
+DB_PASSWORD = settings.db_password
+DB_NAME = settings.db_name
 
 # Validate required environment variables
 if not all([DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME]):
@@ -20,27 +21,53 @@ if not all([DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME]):
         "Please set DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, and DB_NAME"
     )
 
-# Create database URL
+# Create database URLs (sync for worker/services, async for API routes)
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"mysql+asyncmy://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+def _json_serializer(value) -> str:
+    """Serialize JSON columns with orjson (str, MySQL rejects binary-charset JSON)"""
+    return orjson.dumps(value).decode()
+
+# No pool_pre_ping (a SELECT 1 per checkout): connections are recycled before
+# MySQL's wait_timeout drops them, and a connection that still turns out dead
+# raises a disconnect error, which invalidates the pool so the next checkout
+# reconnects. Keep DB_POOL_RECYCLE_SECONDS below the server's wait_timeout.
 
 # Create engine
-engine = create_engine(
+engine = make_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+    # Sized for concurrent batch executions (each holds a session for its whole run)
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=False,
+    pool_timeout=10,
+    pool_reset_on_return='rollback',
+    pool_recycle=settings.db_pool_recycle_seconds,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    echo=False
+)
+
+# Create async engine (used by FastAPI routes so DB I/O doesn't block the event loop)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=20,
+    max_overflow=10,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
     echo=False
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factories
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
-def get_db() -> Session:
-    """Get database session for FastAPI dependency injection"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass  # Don't close here, will be closed by FastAPI
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Get async database session for FastAPI dependency injection"""
+    async with AsyncSessionLocal() as db:
+        yield db
 
 @contextmanager
 def get_db_session():
@@ -4,11 +4,31 @@ Supports both JSON and Console formats, matching Go API's zerolog style
 """
 
 import logging
-import json
+import orjson
 import sys
-import os
-from datetime import datetime
+import time
+from functools import lru_cache
 from typing import Any, Dict
+from shared.settings import get_settings
+
+# Context fields (passed via extra=) that formatters include, in output order
+EXTRA_FIELDS = ('execution_id', 'config_id', 'duration_ms', 'rows', 'stage', 'query')
+
+
+# log_with_context level names
+_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
+
+@lru_cache(maxsize=1)
+def _format_timestamp(seconds: int) -> str:
+    """Local time of a log record (same value for every record within one second)"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds))
 
 
 class StructuredFormatter(logging.Formatter):
@@ -17,29 +37,21 @@ class StructuredFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
             "level": record.levelname.lower(),
-            "time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "time": _format_timestamp(int(record.created)),
             "message": record.getMessage(),
         }
 
         # Add extra fields
-        if hasattr(record, 'execution_id'):
-            log_data['execution_id'] = record.execution_id
-        if hasattr(record, 'config_id'):
-            log_data['config_id'] = record.config_id
-        if hasattr(record, 'duration_ms'):
-            log_data['duration_ms'] = record.duration_ms
-        if hasattr(record, 'rows'):
-            log_data['rows'] = record.rows
-        if hasattr(record, 'stage'):
-            log_data['stage'] = record.stage
-        if hasattr(record, 'query'):
-            log_data['query'] = record.query
+        record_fields = record.__dict__
+        for name in EXTRA_FIELDS:
+            if name in record_fields:
+                log_data[name] = record_fields[name]
 
         # Add exception info if present
         if record.exc_info:
             log_data['error'] = self.formatException(record.exc_info)
 
-        return json.dumps(log_data)
+        return orjson.dumps(log_data).decode()
 
 
 class ConsoleFormatter(logging.Formatter):
@@ -59,7 +71,7 @@ class ConsoleFormatter(logging.Formatter):
 
     def format(self, record: logging.LogRecord) -> str:
         # Timestamp in gray
-        timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S%z")
+        timestamp = _format_timestamp(int(record.created))
         timestamp_colored = f"{self.GRAY}{timestamp}{self.RESET}"
 
         # Level with color
@@ -73,18 +85,10 @@ class ConsoleFormatter(logging.Formatter):
         log_parts = [timestamp_colored, level_colored, message]
 
         # Add structured fields in cyan
-        if hasattr(record, 'execution_id'):
-            log_parts.append(f"{self.CYAN}execution_id={self.RESET}{record.execution_id}")
-        if hasattr(record, 'config_id'):
-            log_parts.append(f"{self.CYAN}config_id={self.RESET}{record.config_id}")
-        if hasattr(record, 'duration_ms'):
-            log_parts.append(f"{self.CYAN}duration_ms={self.RESET}{record.duration_ms}")
-        if hasattr(record, 'rows'):
-            log_parts.append(f"{self.CYAN}rows={self.RESET}{record.rows}")
-        if hasattr(record, 'stage'):
-            log_parts.append(f"{self.CYAN}stage={self.RESET}{record.stage}")
-        if hasattr(record, 'query'):
-            log_parts.append(f"{self.CYAN}query={self.RESET}{record.query}")
+        record_fields = record.__dict__
+        for name in EXTRA_FIELDS:
+            if name in record_fields:
+                log_parts.append(f"{self.CYAN}{name}={self.RESET}{record_fields[name]}")
 
         # Add exception if present
         if record.exc_info:
@@ -107,8 +111,9 @@ def setup_logger(name: str = None, log_format: str = None, log_level: str = None
     """
 
     # Get configuration from environment or defaults
-    log_format = log_format or os.getenv('LOG_FORMAT', 'console')
-    log_level = log_level or os.getenv('LOG_LEVEL', 'info')
+    settings = get_settings()
+    log_format = log_format or settings.log_format
+    log_level = log_level or settings.log_level
 
     # Create logger
     logger = logging.getLogger(name or __name__)
@@ -139,6 +144,7 @@ def log_with_context(logger: logging.Logger, level: str, message: str, **kwargs)
         log_with_context(logger, 'info', 'Query executed',
                         execution_id='123', duration_ms=500, rows=10)
     """
-    extra = kwargs
-    log_method = getattr(logger, level.lower())
-    log_method(message, extra=extra)
+    level_no = _LEVELS[level.lower()]
+    if not logger.isEnabledFor(level_no):
+        return
+    logger.log(level_no, message, extra=kwargs)
@@ -1,50 +1,86 @@
-from sqlalchemy import Column, Integer, String, Text, JSON, TIMESTAMP, Enum, Boolean, BigInteger, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, JSON, TIMESTAMP, Enum, Boolean, BigInteger, ForeignKey, Index, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.orm import deferred, relationship, raiseload
+from typing import Tuple
+from shared.settings import get_settings
 
 Base = declarative_base()
 
+# Deferred group for large TEXT/JSON columns: not fetched by plain queries,
+# callers that read them add .options(undefer_group(HEAVY))
+HEAVY = 'heavy'
+
+# Table options for create_all(): DYNAMIC rows keep long VARCHAR/TEXT values
+# off-page and allow utf8mb4 index prefixes up to 3072 bytes
+MYSQL_TABLE_OPTIONS = {'mysql_engine': 'InnoDB', 'mysql_row_format': 'DYNAMIC', 'mysql_charset': 'utf8mb4'}
+
+# Enumerated columns, defined once with explicit type names. MySQL stores these
+# as native ENUM (1-2 bytes per value, compared as integers); on PostgreSQL the
+# name is the CREATE TYPE name
+DATASOURCE_TYPE = Enum('mysql', 'postgresql', 'oracle', 'sqlserver', 'mongodb', 'bigquery', 'snowflake',
+                       name='datasource_type')
+OUTPUT_FORMAT = Enum('csv', 'xlsx', 'json', 'pdf', name='output_format')
+DELIVERY_METHOD = Enum('email', 'sftp', 'webhook', 's3', 'file_share', name='delivery_method')
+EXECUTION_STATUS = Enum('queued', 'running', 'completed', 'failed', 'cancelled', name='execution_status')
+DELIVERY_STATUS = Enum('pending', 'success', 'failed', 'retry', name='delivery_status')
+
 class ReportDatasource(Base):
     """Maps to report_datasources table"""
     __tablename__ = 'report_datasources'
+    __table_args__ = (MYSQL_TABLE_OPTIONS,)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
-    connection_url = Column(Text, nullable=False)
-    db_type = Column(Enum('mysql', 'postgresql', 'oracle', 'sqlserver', 'mongodb', 'bigquery', 'snowflake'), nullable=False)
-    connection_config = Column(JSON, nullable=True)
+    connection_url = deferred(Column(Text, nullable=False), group=HEAVY)
+    db_type = Column(DATASOURCE_TYPE, nullable=False)
+    connection_config = deferred(Column(JSON, nullable=True), group=HEAVY)
     is_active = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     created_by = Column(String(100))
     updated_by = Column(String(100))
 
+    # Relationships
+    configs = relationship("ReportConfig", back_populates="datasource", lazy="select")
+
 class ReportConfig(Base):
     """Maps to report_configs table"""
     __tablename__ = 'report_configs'
+    __table_args__ = (MYSQL_TABLE_OPTIONS,)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     report_name = Column(String(200), nullable=False)
-    report_query = Column(Text, nullable=False)
-    output_format = Column(Enum('csv', 'xlsx', 'json', 'pdf'), nullable=False)
+    report_query = deferred(Column(Text, nullable=False), group=HEAVY)
+    output_format = Column(OUTPUT_FORMAT, nullable=False)
     datasource_id = Column(Integer, ForeignKey('report_datasources.id'), nullable=False)
-    parameters = Column(JSON, nullable=True)
+    parameters = deferred(Column(JSON, nullable=True), group=HEAVY)
     timeout_seconds = Column(Integer, default=300)
     max_rows = Column(Integer, default=100000)
     version = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     created_by = Column(String(100))
     updated_by = Column(String(100))
 
     # Relationships
-    datasource = relationship("ReportDatasource", backref="configs")
+    datasource = relationship("ReportDatasource", back_populates="configs", lazy="select")
+    # Fan-out collections iterated in batch: one SELECT ... WHERE config_id IN (...)
+    # per collection instead of one per config (selectin, not joined, so sibling
+    # collections don't multiply rows)
+    schedules = relationship("ReportSchedule", back_populates="config", lazy="selectin")
+    deliveries = relationship("ReportDelivery", back_populates="config", lazy="selectin")
+    executions = relationship("ReportExecution", back_populates="config", lazy="select")
+    delivery_logs = relationship("ReportDeliveryLog", back_populates="config", lazy="select")
 
 class ReportSchedule(Base):
     """Maps to report_schedules table"""
     __tablename__ = 'report_schedules'
+    __table_args__ = (
+        # Scheduler's "who's due" poll: equality column first, then the range
+        Index('ix_sched_active_next', 'is_active', 'next_run_at'),
+        MYSQL_TABLE_OPTIONS,
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     config_id = Column(Integer, ForeignKey('report_configs.id'), nullable=False)
@@ -53,94 +89,140 @@ class ReportSchedule(Base):
     is_active = Column(Boolean, default=True)
     last_run_at = Column(TIMESTAMP, nullable=True)
     next_run_at = Column(TIMESTAMP, nullable=True)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     created_by = Column(String(100))
     updated_by = Column(String(100))
 
     # Relationships
-    config = relationship("ReportConfig", backref="schedules")
+    config = relationship("ReportConfig", back_populates="schedules", lazy="select")
+    executions = relationship("ReportExecution", back_populates="schedule", lazy="select")
+    delivery_logs = relationship("ReportDeliveryLog", back_populates="schedule", lazy="select")
 
 class ReportDelivery(Base):
     """Maps to report_deliveries table"""
     __tablename__ = 'report_deliveries'
+    __table_args__ = (
+        Index('ix_deliv_cfg_active', 'config_id', 'is_active'),
+        MYSQL_TABLE_OPTIONS,
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     config_id = Column(Integer, ForeignKey('report_configs.id'), nullable=False)
     delivery_name = Column(String(200), nullable=False)
-    method = Column(Enum('email', 'sftp', 'webhook', 's3', 'file_share'), nullable=False)
-    delivery_config = Column(JSON, nullable=False)
+    method = Column(DELIVERY_METHOD, nullable=False)
+    delivery_config = deferred(Column(JSON, nullable=False), group=HEAVY)
     max_retry = Column(Integer, default=3)
     retry_interval_minutes = Column(Integer, default=5)
     is_active = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     created_by = Column(String(100))
     updated_by = Column(String(100))
 
     # Relationships
-    config = relationship("ReportConfig", backref="deliveries")
+    config = relationship("ReportConfig", back_populates="deliveries", lazy="select")
+    recipients = relationship("ReportDeliveryRecipient", back_populates="delivery", lazy="selectin")
+    logs = relationship("ReportDeliveryLog", back_populates="delivery", lazy="select")
+    # Active recipients only, loaded for all deliveries in one SELECT ... IN
+    active_recipients = relationship(
+        "ReportDeliveryRecipient",
+        primaryjoin="and_(ReportDeliveryRecipient.delivery_id == ReportDelivery.id, "
+                    "ReportDeliveryRecipient.is_active == True)",
+        viewonly=True,
+        lazy="selectin"
+    )
 
 class ReportDeliveryRecipient(Base):
     """Maps to report_delivery_recipients table"""
     __tablename__ = 'report_delivery_recipients'
+    __table_args__ = (
+        Index('ix_recip_deliv_active', 'delivery_id', 'is_active'),
+        # Lookup by address; 191-char prefix covers every real email in utf8mb4
+        Index('ix_recipient_value', 'recipient_value', mysql_length=191),
+        MYSQL_TABLE_OPTIONS,
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     delivery_id = Column(Integer, ForeignKey('report_deliveries.id'), nullable=False)
     recipient_type = Column(String(20), default='email')
     recipient_value = Column(String(500), nullable=False)
     is_active = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    delivery = relationship("ReportDelivery", backref="recipients")
+    delivery = relationship("ReportDelivery", back_populates="recipients", lazy="select")
 
 class ReportExecution(Base):
     """Maps to report_executions table"""
     __tablename__ = 'report_executions'
+    __table_args__ = (
+        Index('ix_exec_cfg_status_time', 'config_id', 'status', 'started_at'),
+        MYSQL_TABLE_OPTIONS,
+    )
 
     id = Column(String(36), primary_key=True)  # UUID
     config_id = Column(Integer, ForeignKey('report_configs.id'), nullable=False)
     schedule_id = Column(Integer, ForeignKey('report_schedules.id'), nullable=True)
-    status = Column(Enum('queued', 'running', 'completed', 'failed', 'cancelled'), default='running')
-    started_at = Column(TIMESTAMP, default=datetime.utcnow)
+    status = Column(EXECUTION_STATUS, default='running')
+    started_at = Column(TIMESTAMP, server_default=func.now())
     completed_at = Column(TIMESTAMP, nullable=True)
     executed_by = Column(String(100), default='system')
-    execution_context = Column(JSON, nullable=True)
+    execution_context = deferred(Column(JSON, nullable=True), group=HEAVY)
     query_execution_time_ms = Column(Integer, nullable=True)
     rows_returned = Column(Integer, nullable=True)
-    file_generated_path = Column(Text, nullable=True)
+    file_generated_path = deferred(Column(Text, nullable=True), group=HEAVY)
     file_size_bytes = Column(BigInteger, nullable=True)
-    error_message = Column(Text, nullable=True)
+    error_message = deferred(Column(Text, nullable=True), group=HEAVY)
 
     # Relationships
-    config = relationship("ReportConfig", backref="executions")
-    schedule = relationship("ReportSchedule", backref="executions")
+    config = relationship("ReportConfig", back_populates="executions", lazy="select")
+    schedule = relationship("ReportSchedule", back_populates="executions", lazy="select")
+    delivery_logs = relationship("ReportDeliveryLog", back_populates="execution", lazy="select")
 
 class ReportDeliveryLog(Base):
     """Maps to report_delivery_logs table"""
     __tablename__ = 'report_delivery_logs'
+    __table_args__ = (
+        Index('ix_delivlog_exec_status', 'execution_id', 'status'),
+        Index('ix_delivlog_cfg_sent', 'config_id', 'sent_at'),
+        MYSQL_TABLE_OPTIONS,
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     config_id = Column(Integer, ForeignKey('report_configs.id'), nullable=False)
     delivery_id = Column(Integer, ForeignKey('report_deliveries.id'), nullable=False)
     schedule_id = Column(Integer, ForeignKey('report_schedules.id'), nullable=True)
     execution_id = Column(String(36), ForeignKey('report_executions.id'), nullable=False)
-    status = Column(Enum('pending', 'success', 'failed', 'retry'), default='pending')
-    sent_at = Column(TIMESTAMP, default=datetime.utcnow)
+    status = Column(DELIVERY_STATUS, default='pending')
+    sent_at = Column(TIMESTAMP, server_default=func.now())
     completed_at = Column(TIMESTAMP, nullable=True)
     recipient_count = Column(Integer, default=0)
     success_count = Column(Integer, default=0)
     failure_count = Column(Integer, default=0)
     retry_count = Column(Integer, default=0)
-    error_message = Column(Text, nullable=True)
-    delivery_details = Column(JSON, nullable=True)
+    error_message = deferred(Column(Text, nullable=True), group=HEAVY)
+    delivery_details = deferred(Column(JSON, nullable=True), group=HEAVY)
     file_size_bytes = Column(BigInteger, nullable=True)
     processing_time_ms = Column(Integer, nullable=True)
 
     # Relationships
-    config = relationship("ReportConfig", backref="delivery_logs")
-    delivery = relationship("ReportDelivery", backref="logs")
-    schedule = relationship("ReportSchedule", backref="delivery_logs")
-    execution = relationship("ReportExecution", backref="delivery_logs")
+    # Parents are never loaded implicitly (lazy='raise'): listing code picks what
+    # it reads, e.g. .options(selectinload(ReportDeliveryLog.execution),
+    # selectinload(ReportDeliveryLog.delivery)). Avoid joined loading all four,
+    # which repeats every parent's columns on each log row
+    config = relationship("ReportConfig", back_populates="delivery_logs", lazy="raise")
+    delivery = relationship("ReportDelivery", back_populates="logs", lazy="raise")
+    schedule = relationship("ReportSchedule", back_populates="delivery_logs", lazy="raise")
+    execution = relationship("ReportExecution", back_populates="delivery_logs", lazy="raise")
+
+def strict_loading_options() -> Tuple:
+    """
+    Query options that make unplanned lazy loads fail loudly
+
+    Returns raiseload('*') when DB_STRICT_LOADING is enabled (dev/CI), so an
+    N+1 on ReportExecution/ReportDeliveryLog queries raises instead of
+    silently issuing one SELECT per row; empty in production.
+    """
+    return (raiseload('*'),) if get_settings().db_strict_loading else ()
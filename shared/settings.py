@@ -0,0 +1,90 @@
+"""
+Application settings read once from the environment (.env supported)
+
+Every module goes through get_settings() instead of calling os.getenv
+and load_dotenv itself, so .env is parsed a single time per process.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Environment configuration snapshot"""
+
+    # Database
+    db_host: Optional[str]
+    db_port: Optional[str]
+    db_user: Optional[str]
+    db_password: Optional[str]
+    db_name: Optional[str]
+    db_pool_recycle_seconds: int
+    db_strict_loading: bool
+
+    # Report output
+    report_output_path: Optional[str]
+
+    # Kafka
+    kafka_bootstrap_servers: Tuple[str, ...]
+    kafka_topic_execution_requests: str
+    kafka_consumer_group: str
+    kafka_security_protocol: str
+    kafka_sasl_username: Optional[str]
+    kafka_sasl_password: Optional[str]
+    kafka_batch_concurrency: int
+    kafka_max_poll_records: int
+    kafka_fetch_min_bytes: int
+    kafka_fetch_max_wait_ms: int
+    kafka_fetch_max_bytes: int
+
+    # Mailgun
+    mailgun_api_key: Optional[str]
+    mailgun_domain: Optional[str]
+    mail_from: str
+    mail_from_address: str
+
+    # Logging
+    log_format: str
+    log_level: str
+
+    # API
+    execution_api_port: int
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load .env and read all settings (cached for the life of the process)"""
+    load_dotenv()
+
+    return Settings(
+        db_host=os.getenv('DB_HOST'),
+        db_port=os.getenv('DB_PORT'),
+        db_user=os.getenv('DB_USER'),
+        db_password=os.getenv('DB_PASSWORD'),
+        db_name=os.getenv('DB_NAME'),
+        db_pool_recycle_seconds=int(os.getenv('DB_POOL_RECYCLE_SECONDS', 3600)),
+        db_strict_loading=os.getenv('DB_STRICT_LOADING', 'false').lower() in ('1', 'true', 'yes'),
+        report_output_path=os.getenv('REPORT_OUTPUT_PATH'),
+        kafka_bootstrap_servers=tuple(os.getenv('KAFKA_BOOTSTRAP_SERVERS', '').split(',')),
+        kafka_topic_execution_requests=os.getenv('KAFKA_TOPIC_EXECUTION_REQUESTS', 'report-scheduler-execution-request'),
+        kafka_consumer_group=os.getenv('KAFKA_CONSUMER_GROUP', 'report-workers'),
+        kafka_security_protocol=os.getenv('KAFKA_SECURITY_PROTOCOL', 'SASL_SSL').upper(),
+        kafka_sasl_username=os.getenv('KAFKA_SASL_USERNAME'),
+        kafka_sasl_password=os.getenv('KAFKA_SASL_PASSWORD'),
+        kafka_batch_concurrency=int(os.getenv('KAFKA_BATCH_CONCURRENCY', 5)),
+        kafka_max_poll_records=int(os.getenv('KAFKA_MAX_POLL_RECORDS', 50)),
+        kafka_fetch_min_bytes=int(os.getenv('KAFKA_FETCH_MIN_BYTES', 65536)),
+        kafka_fetch_max_wait_ms=int(os.getenv('KAFKA_FETCH_MAX_WAIT_MS', 1000)),
+        kafka_fetch_max_bytes=int(os.getenv('KAFKA_FETCH_MAX_BYTES', 52428800)),
+        mailgun_api_key=os.getenv('MAILGUN_API_KEY'),
+        mailgun_domain=os.getenv('MAILGUN_DOMAIN'),
+        mail_from=os.getenv('MAIL_FROM', 'Finpay'),
+        mail_from_address=os.getenv('MAIL_FROM_ADDRESS', 'no-reply@finpay.id'),
+        log_format=os.getenv('LOG_FORMAT', 'console'),
+        log_level=os.getenv('LOG_LEVEL', 'info'),
+        execution_api_port=int(os.getenv('EXECUTION_API_PORT', 8000)),
+    )
@@ -1,8 +1,17 @@
-import pytz
-from datetime import datetime
+import random
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql.expression import Insert
+from sqlalchemy.orm import Session
+from zoneinfo import ZoneInfo
 
 # Default timezone for the application
-DEFAULT_TIMEZONE = pytz.timezone('Asia/Jakarta')
+DEFAULT_TIMEZONE = ZoneInfo('Asia/Jakarta')
 
 def now_jakarta():
     """Get current datetime in Asia/Jakarta timezone (timezone-naive for MySQL)"""
@@ -11,5 +20,114 @@ def now_jakarta():
 def utc_to_jakarta(dt: datetime) -> datetime:
     """Convert UTC datetime to Asia/Jakarta"""
     if dt.tzinfo is None:
-        dt = pytz.utc.localize(dt)
+        dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(DEFAULT_TIMEZONE).replace(tzinfo=None)
+
+def retry_backoff_seconds(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with jitter for retry waits
+
+    Args:
+        attempt: Attempt number that just failed (1-based)
+        base: Wait after the first failure, in seconds
+        cap: Upper bound for any single wait, in seconds
+
+    Returns:
+        float: Seconds to wait before the next attempt
+    """
+    return min(cap, base * (2 ** (attempt - 1)) + random.uniform(0, 1))
+
+def make_engine(
+    url: str,
+    pool_size: int = 25,
+    max_overflow: int = 25,
+    pool_pre_ping: bool = True,
+    pool_recycle: int = 1800,
+    **kwargs
+) -> Engine:
+    """
+    Create a pooled SQLAlchemy engine with the service's pool defaults
+
+    Build one engine per database and keep it for the life of the process
+    (module level or a cache); never create one per request or execution.
+
+    Args:
+        url: SQLAlchemy connection string
+        pool_size: Connections kept open in the pool
+        max_overflow: Extra connections allowed under burst load
+        pool_pre_ping: Test each connection on checkout (SELECT 1)
+        pool_recycle: Reopen connections older than this many seconds
+        **kwargs: Passed through to create_engine
+
+    Returns:
+        Engine with its own connection pool
+    """
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=pool_pre_ping,
+        pool_recycle=pool_recycle,
+        **kwargs
+    )
+
+@lru_cache(maxsize=None)
+def _insert_statement(model) -> Insert:
+    """Build the INSERT construct for a mapped class once and reuse it"""
+    return insert(model)
+
+def bulk_insert(session: Session, model, rows: Iterable[Dict[str, Any]], batch_size: int = 500) -> int:
+    """
+    Insert plain dict rows in batches with a Core INSERT (executemany)
+
+    Skips ORM instances, identity map and unit-of-work bookkeeping, so it suits
+    append-only rows (e.g. archived delivery logs) that the caller won't touch
+    afterwards. Generated primary keys are not returned.
+
+    Args:
+        session: Open session (rows go out in its transaction)
+        model: Mapped class, e.g. ReportDeliveryLog
+        rows: Column-name -> value dicts, all with the same keys
+        batch_size: Rows per executemany round trip
+
+    Returns:
+        int: Number of rows inserted
+    """
+    statement = _insert_statement(model)
+    rows = iter(rows)
+    inserted = 0
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return inserted
+        session.execute(statement, batch)
+        inserted += len(batch)
+
+@contextmanager
+def count_queries(conn: Connection) -> Iterator[List[str]]:
+    """
+    Collect the SQL statements executed on a connection inside the block
+
+    Meant for guarding eager-loading choices against N+1 regressions:
+
+        with count_queries(session.connection()) as queries:
+            session.execute(select(ReportConfig)).scalars().all()
+        assert len(queries) <= 2
+
+    Args:
+        conn: Connection to watch (e.g. session.connection())
+
+    Yields:
+        list: Statements in execution order (filled while the block runs)
+    """
+    queries: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(conn, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(conn, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,51 @@
+import sqlite3
+import unittest
+
+from execution_engine.services.query_builder import can_project_columns, project_columns
+
+
+class ProjectColumnsTest(unittest.TestCase):
+    """Display-column projection must never change what the report returns"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE t (a INTEGER, b TEXT, c TEXT)')
+        self.conn.executemany('INSERT INTO t VALUES (?, ?, ?)', [(2, 'x', 'p'), (3, 'y', 'q'), (1, 'z', 'r')])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_sorted_query_keeps_row_order(self):
+        query = 'SELECT a, b, c FROM t ORDER BY a DESC'
+        final_query = project_columns(query, ['b', 'a'], ['a', 'b', 'c'])
+
+        # ORDER BY isn't guaranteed to survive a derived table, so the query runs as written
+        self.assertEqual(final_query, query)
+        self.assertEqual([row[0] for row in self.conn.execute(final_query)], [3, 2, 1])
+
+    def test_plain_query_fetches_only_display_columns(self):
+        final_query = project_columns('SELECT a, b, c FROM t', ['b', 'a'], ['a', 'b', 'c'])
+
+        cursor = self.conn.execute(final_query)
+        self.assertEqual([d[0] for d in cursor.description], ['b', 'a'])
+        self.assertEqual(sorted(cursor.fetchall()), [('x', 2), ('y', 3), ('z', 1)])
+
+    def test_nothing_dropped_keeps_query(self):
+        query = 'SELECT a, b FROM t'
+        self.assertEqual(project_columns(query, ['b', 'a'], ['a', 'b']), query)
+        self.assertEqual(project_columns(query, ['missing'], ['a', 'b']), query)
+
+    def test_materialized_queries_are_not_projected(self):
+        for query in (
+            'SELECT a, COUNT(*) AS n FROM t GROUP BY a',
+            'SELECT DISTINCT a, b FROM t',
+            'SELECT a, b FROM t UNION SELECT a, c FROM t',
+            'select a, b from t order by a',
+        ):
+            with self.subTest(query=query):
+                self.assertFalse(can_project_columns(query))
+                self.assertEqual(project_columns(query, ['a'], ['a', 'b']), query)
+
+
+if __name__ == '__main__':
+    unittest.main()